@@ -0,0 +1,297 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.events import get_hub
+from posts.models import Comment, Follow, Group, Post, User
+
+INDEX = reverse('api:index')
+FOLLOW = reverse('api:follow_index')
+
+
+class CountQueries:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.author,
+                 group=cls.group if number % 2 else None)
+            for number in range(15))
+        # Одинаковые даты: порядок держится на id.
+        start = timezone.now()
+        for post in Post.objects.all():
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start - timedelta(minutes=post.pk // 2))
+        cls.ordered = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        return response, json.loads(response.content)
+
+    def walk(self, url, **params):
+        """id всех постов по ссылкам next."""
+        ids = []
+        response, data = self.get(url, **params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in data['results']]
+            if data['next'] is None:
+                return ids
+            response, data = self.get(data['next'])
+
+    def test_cursor_pages_cover_feed(self):
+        """Страницы по next идут без пропусков и повторов."""
+        self.assertEqual(self.walk(INDEX, limit=4), self.ordered)
+        group = reverse('api:group_posts', args=[self.group.slug])
+        self.assertEqual(
+            self.walk(group, limit=3),
+            [pk for pk in self.ordered if pk % 2 == 0])
+
+    def test_fields(self):
+        """?fields= отдаёт только запрошенные поля в их порядке."""
+        _, data = self.get(INDEX, fields='author,text', limit=1)
+        self.assertEqual(
+            list(data['results'][0].items()),
+            [('author', 'author'), ('text', Post.objects.get(
+                pk=self.ordered[0]).text)])
+        response, data = self.get(INDEX, fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', data['detail'])
+
+    def test_bad_parameters(self):
+        for params in ({'limit': 0}, {'limit': 'x'}, {'cursor': 'bad'}):
+            with self.subTest(params=params):
+                response, _ = self.get(INDEX, **params)
+                self.assertEqual(response.status_code, 400)
+        response, _ = self.get(reverse('api:profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_follow(self):
+        """Лента подписок доступна только после входа."""
+        response, _ = self.get(FOLLOW)
+        self.assertEqual(response.status_code, 401)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.walk(FOLLOW, limit=6), self.ordered)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_follow_pull_authors(self):
+        """Посты авторов без рассылки подмешиваются в ленту."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.walk(FOLLOW, limit=6), self.ordered)
+
+    def test_cached(self):
+        """Повторный запрос берётся из кэша, новый пост его сбрасывает."""
+        self.get(INDEX)
+        counter = CountQueries()
+        with connection.execute_wrapper(counter):
+            response, _ = self.get(INDEX)
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(
+            self.client.get(INDEX, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 304)
+        post = Post.objects.create(text='Новый', author=self.author)
+        _, data = self.get(INDEX)
+        self.assertEqual(data['results'][0]['id'], post.pk)
+
+
+class SinceApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Старый', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('api:index_since'),
+            reverse('api:group_since', args=[self.group.slug]),
+            reverse('api:profile_since', args=[self.author.username]),
+            reverse('api:follow_since'),
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_nothing_new_without_database(self):
+        """Если клиент видел последний пост, база не читается."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.get(url, since=self.post.pk)
+                counter = CountQueries()
+                with connection.execute_wrapper(counter):
+                    self.client.get(url, {'since': self.post.pk})
+                # Сессия и пользователь — для ленты подписок.
+                limit = 2 if url == self.urls[-1] else 0
+                self.assertLessEqual(counter.count, limit)
+
+    def test_new_posts(self):
+        """Новые посты приходят от старых к новым, по limit за раз."""
+        for url in self.urls:
+            self.get(url, since=self.post.pk)
+        new = [Post.objects.create(text=f'Новый {number}',
+                                   author=self.author, group=self.group)
+               for number in range(3)]
+        for url in self.urls:
+            with self.subTest(url=url):
+                data = self.get(url, since=self.post.pk, limit=2)
+                self.assertEqual(
+                    [item['id'] for item in data['results']],
+                    [post.pk for post in new[:2]])
+                self.assertTrue(data['has_more'])
+                data = self.get(url, since=data['since'], limit=2)
+                self.assertEqual(
+                    [item['id'] for item in data['results']], [new[2].pk])
+                self.assertEqual(data['since'], new[2].pk)
+                self.assertFalse(data['has_more'])
+
+    def test_since_time(self):
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=timezone.now() - timedelta(hours=1))
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        data = self.get(self.urls[0], since=since)
+        self.assertEqual((data['results'], data['since']), ([], since))
+        new = Post.objects.create(text='Новый', author=self.author)
+        data = self.get(self.urls[0], since=since)
+        self.assertEqual([item['id'] for item in data['results']], [new.pk])
+
+    def test_since_round_trip(self):
+        """pub_date из ответа, возвращённый в since, не повторяет пост."""
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=timezone.now().replace(microsecond=123456)
+            - timedelta(seconds=1))
+        since = self.get(reverse('api:index'))['results'][0]['pub_date']
+        self.assertEqual(self.get(self.urls[0], since=since)['results'], [])
+        new = Post.objects.create(text='Новый', author=self.author)
+        data = self.get(self.urls[0], since=since)
+        self.assertEqual([item['id'] for item in data['results']], [new.pk])
+        data = self.get(self.urls[0], since=data['results'][0]['pub_date'])
+        self.assertEqual(data['results'], [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_follow_pull_authors(self):
+        """Посты авторов без рассылки тоже сбрасывают отметку ленты."""
+        url = self.urls[-1]
+        self.get(url, since=self.post.pk)
+        new = Post.objects.create(text='Новый', author=self.author)
+        data = self.get(url, since=self.post.pk)
+        self.assertEqual([item['id'] for item in data['results']], [new.pk])
+
+    def test_errors(self):
+        for params in ({}, {'since': 'вчера'}, {'since': 10 ** 6}):
+            with self.subTest(params=params):
+                Post.objects.create(text='Новый', author=self.author)
+                response = self.client.get(self.urls[0], params)
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse('api:group_since', args=['missing']), {'since': 1})
+        self.assertEqual(response.status_code, 404)
+
+
+def run_now(func):
+    func()
+
+
+class EventsApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        events = override_settings(
+            EVENTS_ENABLED=True,
+            EVENTS_PATH=os.path.join(directory, 'events.sqlite3'))
+        events.enable()
+        self.addCleanup(events.disable)
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def published(self):
+        return [(event.topic, event.name, json.loads(event.data))
+                for event in get_hub().journal.read(0)]
+
+    @mock.patch('django.db.transaction.on_commit', run_now)
+    def test_signals_publish(self):
+        """Новый пост уходит во все его ленты, комментарий — с HTML."""
+        post = Post.objects.create(
+            text='Новый', author=self.author, group=self.group)
+        Comment.objects.create(post=post, author=self.author, text='Ура')
+        events = self.published()
+        self.assertEqual(
+            [topic for topic, name, _ in events if name == 'post'],
+            ['global', 'author:author', 'group:group'])
+        topic, name, data = events[-1]
+        self.assertEqual((topic, name), (f'post:{post.pk}', 'comment'))
+        self.assertIn('Ура', data['html'])
+
+    def test_stream(self):
+        response = self.client.get(
+            reverse('api:comment_events', args=[self.post.pk]),
+            HTTP_LAST_EVENT_ID='0')
+        self.addCleanup(response.close)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(next(response.streaming_content)[:6], b'retry:')
+        for url in (reverse('api:group_events', args=['missing']),
+                    reverse('api:comment_events', args=[10 ** 6])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(
+            reverse('api:index_events'), HTTP_LAST_EVENT_ID='x')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(EVENTS_ENABLED=False)
+    @mock.patch('django.db.transaction.on_commit', run_now)
+    def test_disabled(self):
+        """Без EVENTS_ENABLED нет ни потоков, ни скриптов, ни журнала."""
+        cache.clear()
+        self.assertEqual(
+            self.client.get(reverse('api:index_events')).status_code, 404)
+        for url in (reverse('posts:index'),
+                    reverse('posts:post_detail', args=[self.post.pk])):
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'EventSource')
+        Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(self.published(), [])
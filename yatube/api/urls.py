@@ -0,0 +1,27 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.index, name='index'),
+    path('posts/since/', views.index_since, name='index_since'),
+    path('groups/<slug:slug>/posts/', views.group_posts, name='group_posts'),
+    path('groups/<slug:slug>/posts/since/', views.group_since,
+         name='group_since'),
+    path('profiles/<str:username>/posts/', views.profile,
+         name='profile'),
+    path('profiles/<str:username>/posts/since/', views.profile_since,
+         name='profile_since'),
+    path('follow/', views.follow_index, name='follow_index'),
+    path('follow/since/', views.follow_since, name='follow_since'),
+    path('events/posts/', views.index_events, name='index_events'),
+    path('events/posts/<int:post_id>/comments/', views.comment_events,
+         name='comment_events'),
+    path('events/groups/<slug:slug>/', views.group_events,
+         name='group_events'),
+    path('events/profiles/<str:username>/', views.profile_events,
+         name='profile_events'),
+    path('events/follow/', views.follow_events, name='follow_events'),
+]
@@ -0,0 +1,183 @@
+"""Строки постов для API: выборка .values() по курсору и полям запроса.
+
+Модели не создаются: страница — это словари из .values(), которые
+переименовываются в поля ответа и сразу сериализуются.
+"""
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import fetch
+from posts.cache import current_versions, generation_key
+from posts.feed import FollowFeedPaginator
+from posts.models import FeedEntry, Post
+from posts.utils import CursorPaginator
+from yatube.settings import NUMBER_POST
+
+# Поле ответа -> путь в .values().
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+# Без них не построить курсор следующей страницы.
+CURSOR_FIELDS = ('id', 'pub_date')
+# id в курсоре ?since=<время>: новее — только посты с большей датой.
+MAX_ID = 2 ** 63 - 1
+
+
+class BadRequest(ValueError):
+    """Параметр запроса нельзя разобрать."""
+
+
+def parse_fields(value):
+    """Поля ответа из ?fields=a,b; по умолчанию все."""
+    if not value:
+        return list(FIELDS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown or not names:
+        raise BadRequest(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(FIELDS)}.')
+    return list(dict.fromkeys(names))
+
+
+def parse_limit(value):
+    if not value:
+        return NUMBER_POST
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest('limit должен быть числом.')
+    if not 1 <= limit <= settings.API_MAX_LIMIT:
+        raise BadRequest(f'limit от 1 до {settings.API_MAX_LIMIT}.')
+    return limit
+
+
+def rows_for(queryset, fields):
+    """queryset.values() только с нужными полями и ключом курсора."""
+    paths = {FIELDS[name] for name in (*fields, *CURSOR_FIELDS)}
+    return queryset.values(*sorted(paths))
+
+
+def serialize(rows, fields):
+    """Словари ответа из строк .values() в порядке полей запроса.
+
+    Дата отдаётся с микросекундами, а не обрезанной DjangoJSONEncoder
+    до миллисекунд: её можно вернуть в ?since= без повтора поста.
+    """
+    storage = Post._meta.get_field('image').storage
+    result = []
+    for row in rows:
+        item = {name: row[FIELDS[name]] for name in fields}
+        if 'pub_date' in item:
+            item['pub_date'] = item['pub_date'].isoformat()
+        if 'image' in item:
+            item['image'] = (
+                storage.url(item['image']) if item['image'] else None)
+        result.append(item)
+    return result
+
+
+class RowCursorMixin:
+    """Курсор по строкам .values(), а не по объектам модели."""
+
+    def cursor_key(self, row):
+        return row[self.date_field], row['id']
+
+
+class RowPaginator(RowCursorMixin, CursorPaginator):
+    pass
+
+
+class FollowRowPaginator(RowCursorMixin, FollowFeedPaginator):
+    """Лента подписок строками: из FeedEntry читаются только id постов."""
+
+    def feed_rows(self, cursor, newer, limit):
+        ids = list(self.keyset(
+            FeedEntry.objects.filter(user=self.user),
+            cursor, newer, pk_field='post_id',
+        ).values_list('post_id', flat=True)[:limit])
+        if not ids:
+            return []
+        return list(self.keyset(self.object_list.filter(pk__in=ids),
+                                newer=newer))
+
+    def author_rows(self, author_id, cursor, newer, limit):
+        return list(self.keyset(
+            self.object_list.filter(author_id=author_id), cursor, newer,
+        )[:limit])
+
+
+def fetch_page(paginator, token, limit):
+    """Строки после курсора token и курсор следующей страницы или None."""
+    cursor = None
+    if token:
+        cursor = paginator.decode_cursor(token)
+        if cursor is None:
+            raise BadRequest('Неверный cursor.')
+    rows = paginator.fetch(cursor, False, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        number = cursor[0] + 1 if cursor else 1
+        next_cursor = paginator.encode_cursor(rows[-1], number)
+    return rows, next_cursor
+
+
+def parse_since(value):
+    """(дата, id) из ?since=: id поста (дата пока неизвестна) или время."""
+    if not value:
+        raise BadRequest('Нужен since: id поста или время ISO 8601.')
+    if value.isdigit():
+        return None, int(value)
+    date = parse_datetime(value)
+    if date is None:
+        raise BadRequest('since должен быть id поста или временем ISO 8601.')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date, MAX_ID
+
+
+def high_water(name, scopes, paginator):
+    """(дата, id) новейшего поста ленты name или None, если она пуста.
+
+    Отметка лежит в кэше с поколениями областей scopes: пока они не
+    сменились, она читается из памяти процесса (core.cache_backends),
+    без запросов к базе.
+    """
+    versions = current_versions(generation_key(scope) for scope in scopes)
+
+    def newest():
+        rows = paginator.fetch(None, False, 1)
+        return paginator.cursor_key(rows[0]) if rows else None
+
+    return fetch(f'high_water:{name}', newest, settings.PAGE_CACHE_TIME,
+                 version=sorted(versions.items()))
+
+
+def seen(mark, since):
+    """Клиент уже видел новейший пост ленты."""
+    if mark is None:
+        return True
+    date, pk = since
+    if date is None:
+        return mark[1] == pk
+    return mark <= (date, pk)
+
+
+def fetch_newer(paginator, since, limit):
+    """Строки новее since от старых к новым и есть ли ещё."""
+    date, pk = since
+    if date is None:
+        date = Post.objects.filter(pk=pk).values_list(
+            'pub_date', flat=True).first()
+        if date is None:
+            raise BadRequest(f'Пост {pk} не найден, передайте since временем.')
+    rows = paginator.fetch((None, date, pk), True, limit + 1)
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,208 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse, QueryDict
+
+from core.events import stream
+from core.streaming import unbuffered
+from posts.cache import cache_generations, conditional
+from posts.feed import PULL_SCOPE, feed_scope
+from posts.models import Follow, Group, Post, User
+from posts.views import follow_scopes
+from .utils import (BadRequest, FollowRowPaginator, RowPaginator, fetch_newer,
+                    fetch_page, high_water, parse_fields, parse_limit,
+                    parse_since, rows_for, seen, serialize)
+
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+# Параметры запроса страницы ленты, см. posts.cache.cache_generations.
+FEED_PARAMS = ('cursor', 'limit', 'fields')
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def error(detail, status):
+    return json_response({'detail': detail}, status=status)
+
+
+def login_required(view):
+    """Как в posts, но вместо перехода на страницу входа — 401."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Нужна авторизация.', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def feed_page(request, posts, paginator_class=RowPaginator, **kwargs):
+    """Ответ со страницей posts по ?cursor=, ?limit= и ?fields=."""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_limit(request.GET.get('limit'))
+        paginator = paginator_class(rows_for(posts, fields), limit, **kwargs)
+        rows, cursor = fetch_page(paginator, request.GET.get('cursor'), limit)
+    except BadRequest as exception:
+        return error(str(exception), 400)
+    next_url = None
+    if cursor is not None:
+        # Только известные параметры: ответ кэшируется без остальных.
+        query = QueryDict(mutable=True)
+        for name in FEED_PARAMS:
+            query.setlist(name, request.GET.getlist(name))
+        query['cursor'] = cursor
+        next_url = f'{request.path}?{query.urlencode()}'
+    return json_response({
+        'results': serialize(rows, fields),
+        'next_cursor': cursor,
+        'next': next_url,
+    })
+
+
+@conditional('global')
+@cache_generations('global', params=FEED_PARAMS)
+def index(request):
+    return feed_page(request, Post.objects.all())
+
+
+@conditional('group:{slug}')
+@cache_generations('group:{slug}', params=FEED_PARAMS)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return error('Группа не найдена.', 404)
+    return feed_page(request, Post.objects.filter(group_id=group_id))
+
+
+@conditional('author:{username}')
+@cache_generations('author:{username}', params=FEED_PARAMS)
+def profile(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return error('Автор не найден.', 404)
+    return feed_page(request, Post.objects.filter(author_id=author_id))
+
+
+@login_required
+@conditional(follow_scopes)
+def follow_index(request):
+    posts = Post.objects.filter(author__following__user=request.user)
+    return feed_page(request, posts, FollowRowPaginator, user=request.user)
+
+
+def delta(request, name, scopes, posts, owner=None,
+          paginator_class=RowPaginator, **kwargs):
+    """Посты новее ?since= от старых к новым, не больше ?limit=.
+
+    Если новейший пост ленты клиент уже видел, ответ строится по
+    отметке high_water без запросов к базе. owner — queryset владельца
+    ленты: он проверяется, только когда лента пуста.
+    """
+    try:
+        since = parse_since(request.GET.get('since'))
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_limit(request.GET.get('limit'))
+        paginator = paginator_class(rows_for(posts, fields), limit, **kwargs)
+        mark = high_water(name, scopes, paginator)
+        if mark is None and owner is not None and not owner.exists():
+            return error('Лента не найдена.', 404)
+        rows, has_more = [], False
+        if not seen(mark, since):
+            rows, has_more = fetch_newer(paginator, since, limit)
+    except BadRequest as exception:
+        return error(str(exception), 400)
+    last = rows[-1]['id'] if rows else request.GET['since']
+    return json_response({
+        'results': serialize(rows, fields),
+        'since': int(last) if str(last).isdigit() else last,
+        'has_more': has_more,
+    })
+
+
+def index_since(request):
+    return delta(request, 'global', ['global'], Post.objects.all())
+
+
+def group_since(request, slug):
+    return delta(
+        request, f'group:{slug}', [f'group:{slug}'],
+        Post.objects.filter(group__slug=slug),
+        owner=Group.objects.filter(slug=slug))
+
+
+def profile_since(request, username):
+    return delta(
+        request, f'author:{username}', [f'author:{username}'],
+        Post.objects.filter(author__username=username),
+        owner=User.objects.filter(username=username))
+
+
+@login_required
+def follow_since(request):
+    user = request.user
+    return delta(
+        request, feed_scope(user.pk), [feed_scope(user.pk), PULL_SCOPE],
+        Post.objects.filter(author__following__user=user),
+        paginator_class=FollowRowPaginator, user=user)
+
+
+def events_enabled(view):
+    """Потоки SSE доступны только с EVENTS_ENABLED, иначе 404."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.EVENTS_ENABLED:
+            return error('Потоки событий выключены.', 404)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def event_stream(request, topics):
+    """Поток SSE; пропущенное досылается по Last-Event-ID."""
+    last_id = (request.META.get('HTTP_LAST_EVENT_ID')
+               or request.GET.get('last_event_id'))
+    if last_id is not None and not last_id.isdigit():
+        return error('Неверный Last-Event-ID.', 400)
+    response = unbuffered(
+        stream(topics, int(last_id) if last_id else None),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@events_enabled
+def index_events(request):
+    return event_stream(request, ['global'])
+
+
+@events_enabled
+def group_events(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        return error('Группа не найдена.', 404)
+    return event_stream(request, [f'group:{slug}'])
+
+
+@events_enabled
+def profile_events(request, username):
+    if not User.objects.filter(username=username).exists():
+        return error('Автор не найден.', 404)
+    return event_stream(request, [f'author:{username}'])
+
+
+@events_enabled
+def comment_events(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Пост не найден.', 404)
+    return event_stream(request, [f'post:{post_id}'])
+
+
+@events_enabled
+@login_required
+def follow_events(request):
+    """Посты авторов из подписок; новые подписки — с переподключения."""
+    usernames = Follow.objects.filter(user=request.user).values_list(
+        'author__username', flat=True)
+    return event_stream(
+        request, [f'author:{username}' for username in usernames])
@@ -0,0 +1,83 @@
+"""Кэш с защитой от одновременного пересчёта одного ключа.
+
+Значение пересчитывает один запрос, остальные получают прежнюю копию или
+ждут новую. Свежие значения обновляются заранее с вероятностью, которая
+растёт к концу срока (XFetch): чем дольше пересчёт, тем раньше.
+"""
+import math
+import random
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+# Сколько секунд держится блокировка пересчёта.
+LOCK_TIMEOUT = 30
+# Сколько секунд ждать чужой пересчёт, если отдать нечего.
+WAIT_TIME = 2
+WAIT_STEP = 0.05
+
+Entry = namedtuple('Entry', 'value version delta expires')
+
+
+class Uncacheable(Exception):
+    """Бросается из compute, если результат нельзя сохранять."""
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def refresh_early(entry, beta=1.0):
+    """XFetch: пора ли пересчитать значение, не дожидаясь срока."""
+    jitter = -entry.delta * beta * math.log(1 - random.random())
+    return time.time() + jitter >= entry.expires
+
+
+def store(key, compute, timeout, version=None):
+    """Считает значение и кладёт его в кэш вместе с временем пересчёта.
+
+    Запись живёт вдвое дольше timeout: после срока она ещё служит
+    прежней копией, пока идёт пересчёт.
+    """
+    start = time.time()
+    value = compute()
+    now = time.time()
+    cache.set(
+        key, Entry(value, version, now - start, now + timeout), timeout * 2)
+    return value
+
+
+def wait(key, version):
+    deadline = time.monotonic() + WAIT_TIME
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None and entry.version == version:
+            return entry
+    return None
+
+
+def fetch(key, compute, timeout, version=None, beta=1.0):
+    """Значение из кэша; пересчитывает его не больше одного запроса.
+
+    version отличает устаревшие записи, например поколение страницы.
+    Пока один запрос пересчитывает значение, остальные получают
+    прежнюю копию той же версии или ждут до WAIT_TIME секунд новую.
+    """
+    entry = cache.get(key)
+    current = entry is not None and entry.version == version
+    if current and not refresh_early(entry, beta):
+        return entry.value
+    if cache.add(lock_key(key), True, LOCK_TIMEOUT):
+        try:
+            return store(key, compute, timeout, version)
+        finally:
+            cache.delete(lock_key(key))
+    if current:
+        return entry.value
+    fresh = wait(key, version)
+    if fresh is not None:
+        return fresh.value
+    # Копия другой версии устарела: её нельзя отдавать под новым ETag.
+    return compute()
@@ -0,0 +1,454 @@
+"""Двухуровневый кэш: маленький LRU в процессе перед общим хранилищем.
+
+Общее хранилище — любой бэкенд из CACHES, его алиас задаётся в
+OPTIONS['SHARED']. Если хранилище умеет рассылать сообщения об
+инвалидации (publish и invalidations, как SQLiteCache), локальные копии
+сбрасываются по ним не позже чем через POLL_INTERVAL секунд. Иначе
+локальная копия живёт не дольше L1_TIMEOUT.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+FLUSH = '*'
+
+
+class SQLiteCache(BaseCache):
+    """Общее хранилище в файле SQLite с журналом инвалидаций.
+
+    Подходит для нескольких процессов на одной машине: WAL позволяет
+    читать параллельно с записью.
+    """
+
+    # Сколько секунд хранится журнал инвалидаций.
+    LOG_TIME = 600
+    # Через сколько записей удалять просроченные ключи.
+    CULL_EVERY = 1000
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._connection = None
+        self._writes = 0
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            self._connection.executescript('''
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires REAL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS invalidations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    origin TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    created REAL NOT NULL
+                );
+            ''')
+        return self._connection
+
+    @contextmanager
+    def transaction(self):
+        db = self.connection
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _rows(self, timeout, items):
+        expires = self.get_backend_timeout(timeout)
+        return [
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in items
+        ]
+
+    def _write(self, sql, rows):
+        with self.transaction() as db:
+            db.executemany(sql, rows)
+        self._wrote(len(rows))
+
+    def _wrote(self, count):
+        self._writes += count
+        if self._writes >= self.CULL_EVERY:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        now = time.time()
+        with self.transaction() as db:
+            db.execute(
+                'DELETE FROM invalidations WHERE id < (SELECT id FROM '
+                'invalidations WHERE created >= ? ORDER BY id LIMIT 1)',
+                (now - self.LOG_TIME,))
+            db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+            count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+            if count > self._max_entries:
+                # Ключи без срока (версии и поколения) удаляются последними.
+                db.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    'SELECT key FROM cache ORDER BY expires IS NULL, expires '
+                    'LIMIT ?)', (count // self._cull_frequency,))
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        return {
+            key: value
+            for key, (value, _) in self.get_many_expiring(
+                keys, version).items()
+        }
+
+    def get_many_expiring(self, keys, version=None):
+        """Как get_many, но ключ -> (значение, срок по time.time()).
+
+        Срок None — ключ бессрочный.
+        """
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        rows = self.connection.execute(
+            'SELECT key, value, expires FROM cache WHERE key IN (%s) '
+            'AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(made)),
+            (*made, time.time()),
+        )
+        return {
+            made[key]: (pickle.loads(value), expires)
+            for key, value, expires in rows
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            self._rows(timeout, (
+                (self._key(key, version), value)
+                for key, value in data.items())),
+        )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        row = self._rows(timeout, [(self._key(key, version), value)])[0]
+        with self.transaction() as db:
+            added = db.execute(
+                'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) '
+                'DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires '
+                'WHERE cache.expires <= ?', (*row, time.time()),
+            ).rowcount
+        return added == 1
+
+    def incr(self, key, delta=1, version=None):
+        made = self._key(key, version)
+        with self.transaction() as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (made, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), made))
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.transaction() as db:
+            return db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout),
+                 self._key(key, version), time.time()),
+            ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        with self.transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys])
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def clear(self):
+        with self.transaction() as db:
+            db.execute('DELETE FROM cache')
+
+    def publish(self, origin, keys):
+        """Сообщает другим процессам, что ключи keys изменились."""
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(
+                'INSERT INTO invalidations (origin, key, created) '
+                'VALUES (?, ?, ?)', [(origin, key, now) for key in keys])
+        self._wrote(len(keys))
+
+    def invalidations(self, after, origin):
+        """Ключи, изменённые не процессом origin после сообщения after.
+
+        Возвращает номер последнего сообщения и список ключей. Если
+        часть журнала уже удалена, в списке будет FLUSH.
+        """
+        if after is None:
+            last, = self.connection.execute(
+                'SELECT MAX(id) FROM invalidations').fetchone()
+            return last or 0, []
+        rows = self.connection.execute(
+            'SELECT id, origin, key FROM invalidations WHERE id > ? '
+            'ORDER BY id', (after,)).fetchall()
+        if not rows:
+            return after, []
+        keys = [key for _, sender, key in rows if sender != origin]
+        if rows[0][0] > after + 1:
+            keys.append(FLUSH)
+        return rows[-1][0], keys
+
+    def close(self, **kwargs):
+        # Соединение с файлом дешёвое, держим его до конца потока.
+        pass
+
+
+class LocalTier:
+    """LRU процесса, общий для всех потоков."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.origin = f'{self.pid}:{uuid.uuid4().hex}'
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.poll_lock = threading.Lock()
+        self.cursor = None
+        self.polled = 0
+        # Растёт при каждой инвалидации, см. TwoTierCache._remember.
+        self.epoch = 0
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """Кэш в памяти процесса перед общим хранилищем.
+
+    Чтения сначала идут в LRU процесса, записи — сразу в общее хранилище
+    и в LRU, а остальным процессам отправляется сообщение об инвалидации.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', 30)
+        self.poll_interval = options.get('POLL_INTERVAL', 1)
+        self.name = location or self.shared_alias
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def tier(self):
+        tier = _tiers.get(self.name)
+        # После fork у дочернего процесса должен быть свой LRU и свой origin.
+        if tier is None or tier.pid != os.getpid():
+            with _tiers_lock:
+                tier = _tiers[self.name] = LocalTier()
+        return tier
+
+    def _made(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _poll(self, tier):
+        receive = getattr(self.shared, 'invalidations', None)
+        now = time.monotonic()
+        if receive is None or now - tier.polled < self.poll_interval:
+            return
+        if not tier.poll_lock.acquire(blocking=False):
+            return
+        try:
+            cursor, keys = receive(tier.cursor, tier.origin)
+            with tier.lock:
+                tier.cursor, tier.polled = cursor, now
+                if keys:
+                    tier.epoch += 1
+                if FLUSH in keys:
+                    tier.entries.clear()
+                for key in keys:
+                    tier.entries.pop(key, None)
+        finally:
+            tier.poll_lock.release()
+
+    def _publish(self, tier, keys):
+        publish = getattr(self.shared, 'publish', None)
+        if publish is not None:
+            publish(tier.origin, list(keys))
+
+    def _recall(self, tier, made):
+        found = {}
+        now = time.monotonic()
+        with tier.lock:
+            for key in made:
+                expires, value = tier.entries.get(key, (0, None))
+                if expires > now:
+                    tier.entries.move_to_end(key)
+                    found[key] = value
+                elif value is not None:
+                    del tier.entries[key]
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def _remember(self, tier, data, timeout=DEFAULT_TIMEOUT, epoch=None,
+                  deadlines=None):
+        """Кладёт значения в LRU.
+
+        Копия живёт не дольше L1_TIMEOUT и не дольше самого ключа: его
+        срок задаёт timeout или, для прочитанного из хранилища, deadlines —
+        ключ -> срок по time.time(). Истечение ключа в хранилище
+        инвалидаций не рассылает. Если после чтения из общего хранилища
+        пришла инвалидация (epoch изменился), прочитанное могло устареть
+        и в LRU не попадает.
+        """
+        if deadlines is None:
+            deadlines = dict.fromkeys(data, self.get_backend_timeout(timeout))
+        wall, now = time.time(), time.monotonic()
+        rows = {}
+        for key, value in data.items():
+            ttl = self.l1_timeout
+            if deadlines.get(key) is not None:
+                ttl = min(ttl, deadlines[key] - wall)
+            if ttl > 0:
+                rows[key] = (
+                    now + ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with tier.lock:
+            if epoch is not None and epoch != tier.epoch:
+                return
+            for key, row in rows.items():
+                tier.entries[key] = row
+                tier.entries.move_to_end(key)
+            while len(tier.entries) > self._max_entries:
+                tier.entries.popitem(last=False)
+
+    def _drop(self, tier, made):
+        with tier.lock:
+            for key in made:
+                tier.entries.pop(key, None)
+
+    def _forget(self, tier, made):
+        self._drop(tier, made)
+        self._publish(tier, made)
+
+    def _fetch(self, missing, version):
+        """Ключ -> (значение, срок) из общего хранилища."""
+        read = getattr(self.shared, 'get_many_expiring', None)
+        if read is not None:
+            return read(missing, version=version)
+        return {
+            key: (value, None)
+            for key, value in self.shared.get_many(
+                missing, version=version).items()
+        }
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        tier = self.tier
+        self._poll(tier)
+        made = {self._made(key, version): key for key in keys}
+        found = self._recall(tier, made)
+        missing = [made[key] for key in made if key not in found]
+        if missing:
+            epoch = tier.epoch
+            fetched = {
+                self._made(key, version): row
+                for key, row in self._fetch(missing, version).items()
+            }
+            values = {key: value for key, (value, _) in fetched.items()}
+            self._remember(tier, values, epoch=epoch, deadlines={
+                key: expires for key, (_, expires) in fetched.items()})
+            found.update(values)
+        return {made[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        tier = self.tier
+        failed = self.shared.set_many(data, timeout, version=version)
+        made = {
+            self._made(key, version): value
+            for key, value in data.items() if key not in failed
+        }
+        self._remember(tier, made, timeout)
+        self._publish(tier, made)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        tier = self.tier
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            made = self._made(key, version)
+            self._remember(tier, {made: value}, timeout)
+            self._publish(tier, [made])
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        # Счётчики меняются на каждом запросе, поэтому инвалидаций не
+        # рассылают: копии в других процессах живут не дольше L1_TIMEOUT.
+        self._drop(self.tier, [self._made(key, version)])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self._forget(self.tier, [self._made(key, version) for key in keys])
+
+    def clear(self):
+        self.shared.clear()
+        tier = self.tier
+        with tier.lock:
+            tier.entries.clear()
+        self._publish(tier, [FLUSH])
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def events(request):
+    """Включены ли потоки SSE: без них страницы их не открывают."""
+    return {'events_enabled': settings.EVENTS_ENABLED}
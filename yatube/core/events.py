@@ -0,0 +1,288 @@
+"""События для потоков SSE: хаб подписок в процессе и журнал между ними.
+
+publish() пишет события в журнал SQLite (EVENTS_PATH). Он заменяет
+брокер между процессами на одной машине, как журнал инвалидаций кэша.
+В каждом процессе один поток читает новые записи журнала и раздаёт их
+подписчикам этого процесса. Номер записи — id события SSE: по
+Last-Event-ID пропущенные события досылаются из журнала.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', 'id topic name data')
+# Кладётся в очередь подписки, когда поток нужно закрыть.
+CLOSED = object()
+
+
+class Journal:
+    """Журнал событий в файле SQLite, общий для процессов машины."""
+
+    # Сколько секунд события хранятся для досылки.
+    LOG_TIME = 600
+    # Через сколько записей удалять старые события.
+    CULL_EVERY = 1000
+    READ_LIMIT = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.writes = 0
+
+    @property
+    def connection(self):
+        db = getattr(self.local, 'connection', None)
+        if db is None:
+            db = self.local.connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            db.executescript('''
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created REAL NOT NULL
+                );
+            ''')
+        return db
+
+    def append(self, events):
+        """Записывает события (тема, имя, данные) одной транзакцией."""
+        now = time.time()
+        db = self.connection
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT INTO events (topic, name, data, created) '
+                'VALUES (?, ?, ?, ?)',
+                [(topic, name, json.dumps(data, cls=DjangoJSONEncoder,
+                                          ensure_ascii=False), now)
+                 for topic, name, data in events])
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self.writes += len(events)
+        if self.writes >= self.CULL_EVERY:
+            self.writes = 0
+            db.execute('DELETE FROM events WHERE created < ?',
+                       (now - self.LOG_TIME,))
+
+    def last_id(self):
+        """Номер последнего события, даже если его уже удалили."""
+        row = self.connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'events'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def read(self, after, limit=READ_LIMIT):
+        rows = self.connection.execute(
+            'SELECT id, topic, name, data FROM events WHERE id > ? '
+            'ORDER BY id LIMIT ?', (after, limit)).fetchall()
+        return [Event(*row) for row in rows]
+
+    def since(self, after, topics):
+        """События тем topics после after и полон ли журнал с after.
+
+        Если записи после after уже удалены или журнал создан заново,
+        часть событий потеряна.
+        """
+        first, = self.connection.execute(
+            'SELECT MIN(id) FROM events').fetchone()
+        last = self.last_id()
+        if first is None:
+            complete = after == last
+        else:
+            complete = first <= after + 1 and after <= last
+        missed = []
+        while True:
+            events = self.read(after)
+            missed += [event for event in events if event.topic in topics]
+            if len(events) < self.READ_LIMIT:
+                return missed, complete
+            after = events[-1].id
+
+
+class Subscription:
+    """Очередь событий одного соединения."""
+
+    __slots__ = ('topics', 'queue')
+
+    def __init__(self, topics):
+        self.topics = frozenset(topics)
+        self.queue = queue.SimpleQueue()
+
+    def get(self, timeout):
+        """Следующее событие, CLOSED или None, если за timeout ничего."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Hub:
+    """Подписки процесса по темам и поток, читающий журнал.
+
+    Поток запускается с первой подпиской. Подписчик, который не успевает
+    читать (в очереди больше EVENTS_QUEUE_LIMIT), отключается: клиент
+    переподключится и получит пропущенное по Last-Event-ID.
+    """
+
+    def __init__(self, journal):
+        self.pid = os.getpid()
+        self.journal = journal
+        self.topics = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.cursor = None
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics)
+        with self.lock:
+            for topic in subscription.topics:
+                self.topics.setdefault(topic, set()).add(subscription)
+            if self.thread is None:
+                self.cursor = self.journal.last_id()
+                self.thread = threading.Thread(
+                    target=self.run, name='events-hub', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                subscribers = self.topics.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def subscribers(self):
+        with self.lock:
+            return len(set().union(*self.topics.values()))
+
+    def publish(self, events):
+        self.journal.append(events)
+        self.wakeup.set()
+
+    def dispatch(self, events):
+        limit = settings.EVENTS_QUEUE_LIMIT
+        slow = set()
+        with self.lock:
+            for event in events:
+                for subscription in self.topics.get(event.topic, ()):
+                    if subscription.queue.qsize() >= limit:
+                        slow.add(subscription)
+                    else:
+                        subscription.queue.put(event)
+        for subscription in slow:
+            self.unsubscribe(subscription)
+            subscription.queue.put(CLOSED)
+
+    def close_all(self):
+        """Закрывает все потоки процесса, например перед остановкой."""
+        with self.lock:
+            subscriptions = set().union(*self.topics.values())
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+            subscription.queue.put(CLOSED)
+
+    def poll(self):
+        while True:
+            events = self.journal.read(self.cursor)
+            if not events:
+                return
+            self.cursor = events[-1].id
+            self.dispatch(events)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(settings.EVENTS_POLL_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.poll()
+            except sqlite3.Error:
+                # Журнал занят или недоступен: попробуем в следующий раз.
+                continue
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def get_hub():
+    """Хаб процесса для журнала EVENTS_PATH."""
+    path = settings.EVENTS_PATH
+    hub = _hubs.get(path)
+    # После fork потока чтения в дочернем процессе нет.
+    if hub is None or hub.pid != os.getpid():
+        with _hubs_lock:
+            hub = _hubs.get(path)
+            if hub is None or hub.pid != os.getpid():
+                hub = _hubs[path] = Hub(Journal(path))
+    return hub
+
+
+def publish(events):
+    """Отправляет события (тема, имя, данные) подписчикам всех процессов.
+
+    Ошибка журнала не мешает сохранению: клиенты узнают о новом позже,
+    по следующему событию или опросу.
+    """
+    try:
+        get_hub().publish(events)
+    except sqlite3.Error:
+        logger.exception('Не удалось записать события в журнал')
+
+
+def message(event):
+    return (f'id: {event.id}\nevent: {event.name}\n'
+            f'data: {event.data}\n\n')
+
+
+def stream(topics, last_id=None):
+    """Поток SSE по темам topics; last_id — из заголовка Last-Event-ID.
+
+    Раз в EVENTS_HEARTBEAT секунд без событий отправляется комментарий,
+    чтобы прокси не закрыли соединение, а сервер заметил ушедшего
+    клиента. Через EVENTS_STREAM_TIME поток закрывается, и браузер
+    переподключается сам, не теряя событий.
+    """
+    hub = get_hub()
+    subscription = hub.subscribe(topics)
+    try:
+        yield f'retry: {settings.EVENTS_RETRY}\n\n'
+        if last_id is not None:
+            missed, complete = hub.journal.since(last_id, subscription.topics)
+            if not complete:
+                # Часть событий потеряна: клиенту пора перечитать страницу.
+                yield 'event: reset\ndata: {}\n\n'
+                last_id = None
+            for event in missed:
+                last_id = event.id
+                yield message(event)
+        deadline = time.monotonic() + settings.EVENTS_STREAM_TIME
+        while time.monotonic() < deadline:
+            event = subscription.get(settings.EVENTS_HEARTBEAT)
+            if event is CLOSED:
+                return
+            if event is None:
+                yield ': ping\n\n'
+            elif last_id is None or event.id > last_id:
+                yield message(event)
+    finally:
+        hub.unsubscribe(subscription)
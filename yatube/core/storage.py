@@ -0,0 +1,110 @@
+"""Хранилище, в котором имя файла — хэш его содержимого.
+
+Одинаковые загрузки попадают в один файл, поэтому хранятся и обрезаются
+в миниатюры один раз. Содержимое файла по такому имени никогда не
+меняется, и его можно отдавать с заголовком immutable.
+
+Один файл делят несколько постов, поэтому удаление ненужного файла и
+повторная загрузка того же содержимого идут под общей блокировкой, а
+загруженный файл помечается, пока ссылка на него не закоммичена.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Имена из хэша: наши файлы и миниатюры sorl (cache/ab/cd/<ключ>.jpg).
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32,}\.\w+$')
+
+
+def is_hashed(name):
+    """Содержимое файла name не меняется, пока он существует."""
+    return bool(HASHED_NAME.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы хранятся как <каталог>/ab/cd/<sha256>.<расширение>.
+
+    Каталог берётся из upload_to, расширение — из имени загрузки.
+    Повторная загрузка того же содержимого ничего не пишет. Любая
+    загрузка отмечается, пока пост не вызовет settle() после коммита.
+    """
+
+    # Сколько секунд отметка загрузки защищает файл, если ссылку на него
+    # так и не закоммитили (например, транзакция откатилась).
+    UPLOAD_GRACE = 60 * 60
+
+    @contextmanager
+    def locked(self):
+        """Блокировка между процессами для проверки и записи/удаления."""
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def upload_mark(self, name):
+        """Отметки лежат отдельно, чтобы не мешаться среди картинок."""
+        return os.path.join(self.location, '.uploading', name)
+
+    def is_uploading(self, name):
+        """Файл загружен недавно, и ссылка на него ещё не закоммичена."""
+        try:
+            marked = os.path.getmtime(self.upload_mark(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - marked < self.UPLOAD_GRACE
+
+    def settle(self, name):
+        """Ссылка на name закоммичена: отметка загрузки больше не нужна."""
+        try:
+            os.remove(self.upload_mark(name))
+        except FileNotFoundError:
+            pass
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        key = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, key[:2], key[2:4], key + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        with self.locked():
+            if self.exists(name):
+                self.mark_upload(name)
+                return name
+        # Пишем во временный файл и переименовываем: параллельная
+        # загрузка того же содержимого не увидит файл наполовину.
+        temporary = super().save(f'{name}.tmp', content, max_length)
+        with self.locked():
+            os.replace(self.path(temporary), self.path(name))
+            self.mark_upload(name)
+        return name
+
+    def mark_upload(self, name):
+        mark = self.upload_mark(name)
+        os.makedirs(os.path.dirname(mark), exist_ok=True)
+        with open(mark, 'a'):
+            pass
+        os.utime(mark)
+
+    def delete(self, name):
+        super().delete(name)
+        self.settle(name)
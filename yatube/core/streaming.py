@@ -0,0 +1,130 @@
+"""Потоковая отрисовка шаблонов Django: HTML уходит кусками по мере готовности.
+
+Шаблон обходится по узлам, как его отрисовали бы ExtendsNode и
+BlockNode: всё до первого блока родителя (<head> и шапка в base.html)
+отдаётся сразу, а {% for %} внутри блоков — по элементу. Остальные
+теги, в том числе if и include, отрисовываются целиком.
+"""
+from django.http import StreamingHttpResponse
+from django.template.base import TextNode
+from django.template.context import make_context
+from django.template.defaulttags import ForNode
+from django.template.loader import get_template
+from django.template.loader_tags import (BLOCK_CONTEXT_KEY, BlockContext,
+                                         BlockNode, ExtendsNode)
+
+# Мелкие куски копятся до этого размера, чтобы не писать в сокет по байту.
+CHUNK_SIZE = 16 * 1024
+# Кладётся в поток перед блоком: накопленное нужно отдать сейчас.
+FLUSH = object()
+
+
+def render_nodes(nodelist, context):
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            yield from render_extends(node, context)
+        elif isinstance(node, BlockNode):
+            yield FLUSH
+            yield from render_block(node, context)
+        elif (isinstance(node, ForNode) and len(node.loopvars) == 1
+              and not node.is_reversed):
+            yield from render_for(node, context)
+        else:
+            yield node.render_annotated(context)
+
+
+def render_extends(node, context):
+    """Как ExtendsNode.render, но родитель отрисовывается по узлам."""
+    parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for child in parent.nodelist:
+        if not isinstance(child, TextNode):
+            if not isinstance(child, ExtendsNode):
+                block_context.add_blocks({
+                    block.name: block
+                    for block in parent.nodelist.get_nodes_by_type(BlockNode)
+                })
+            break
+    with context.render_context.push_state(parent, isolated_context=False):
+        yield from render_nodes(parent.nodelist, context)
+
+
+def render_block(node, context):
+    """Как BlockNode.render: блок берётся из самого дальнего потомка."""
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            yield from render_nodes(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+        yield from render_nodes(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
+
+
+def render_for(node, context):
+    """Как ForNode.render с одной переменной, по куску на элемент."""
+    parentloop = context['forloop'] if 'forloop' in context else {}
+    with context.push():
+        values = node.sequence.resolve(context, ignore_failures=True)
+        if values is None:
+            values = []
+        if not hasattr(values, '__len__'):
+            values = list(values)
+        length = len(values)
+        if length < 1:
+            yield node.nodelist_empty.render(context)
+            return
+        loop = context['forloop'] = {'parentloop': parentloop}
+        for index, item in enumerate(values):
+            loop.update(
+                counter0=index, counter=index + 1,
+                revcounter=length - index, revcounter0=length - index - 1,
+                first=index == 0, last=index == length - 1,
+            )
+            context[node.loopvars[0]] = item
+            yield ''.join(
+                child.render_annotated(context)
+                for child in node.nodelist_loop)
+
+
+def stream_template(template_name, context=None, request=None):
+    """Куски HTML шаблона для StreamingHttpResponse.
+
+    Контекст вычисляется лениво: значение, обёрнутое в SimpleLazyObject,
+    считается, когда до него дойдёт шаблон, уже после отправки <head>.
+    Ошибка посреди потока обрывает ответ: статус 200 уже отправлен.
+    """
+    template = get_template(template_name).template
+    context = make_context(context, request,
+                           autoescape=template.engine.autoescape)
+    buffer, size = [], 0
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            context.template_name = template.name
+            for part in render_nodes(template.nodelist, context):
+                if part is not FLUSH:
+                    buffer.append(part)
+                    size += len(part)
+                if buffer and (part is FLUSH or size >= CHUNK_SIZE):
+                    yield ''.join(buffer)
+                    buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def unbuffered(chunks, content_type=None):
+    """StreamingHttpResponse, который прокси отдаёт клиенту сразу."""
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    # Иначе nginx копит поток в буфере.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1 +1,268 @@
-pass
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.cache import Entry, Uncacheable, fetch, lock_key, refresh_early
+from core.cache_backends import TwoTierCache
+from core.events import CLOSED, Event, get_hub, publish, stream
+from core.storage import ContentAddressedStorage, is_hashed
+from core.views import media
+
+CACHE_DIR = tempfile.mkdtemp()
+SHARED = {
+    'BACKEND': 'core.cache_backends.SQLiteCache',
+    'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+}
+
+
+def process(name, **options):
+    """Кэш отдельного процесса: у каждого имени свой LRU."""
+    return TwoTierCache(name, {
+        'OPTIONS': {'SHARED': 'shared', 'POLL_INTERVAL': 0, **options},
+    })
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': SHARED,
+})
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.first = process('first')
+        self.second = process('second')
+        self.first.clear()
+
+    def test_shared_store(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.first.set('key', {'value': 1})
+        self.assertEqual(self.second.get('key'), {'value': 1})
+        self.assertIsNone(self.second.get('missing'))
+
+    def test_invalidation(self):
+        """Запись в одном процессе сбрасывает LRU другого."""
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_local_copy(self):
+        """Без сообщения об инвалидации чтение идёт из LRU."""
+        self.first.set('key', 'old')
+        self.second.get('key')
+        self.second.shared.set(self.second.make_key('key'), 'new')
+        self.assertEqual(self.second.get('key'), 'old')
+
+    def test_clear(self):
+        """Очистка в одном процессе сбрасывает LRU всех процессов."""
+        self.first.set('key', 'value')
+        self.second.get('key')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
+
+    def test_add_and_incr(self):
+        """add и incr атомарны в общем хранилище."""
+        self.assertTrue(self.first.add('counter', 1))
+        self.assertFalse(self.second.add('counter', 5))
+        self.assertEqual(self.second.get('counter'), 1)
+        self.assertEqual(self.first.incr('counter', 2), 3)
+        self.assertEqual(self.first.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.first.incr('missing')
+
+    def test_incr_not_published(self):
+        """incr не пишет в журнал инвалидаций."""
+        self.first.set('counter', 1)
+        cursor, _ = self.first.shared.invalidations(None, 'reader')
+        self.first.incr('counter')
+        self.assertEqual(
+            self.first.shared.invalidations(cursor, 'reader')[1], [])
+
+    def test_lru_size(self):
+        """LRU процесса хранит не больше MAX_ENTRIES ключей."""
+        small = process('small', MAX_ENTRIES=2)
+        small.set_many({'a': 1, 'b': 2})
+        small.get('a')
+        small.set('c', 3)
+        self.assertEqual(
+            list(small.tier.entries),
+            [small.make_key('a'), small.make_key('c')])
+        self.assertEqual(small.get('b'), 2)
+
+    def test_local_copy_expires_with_key(self):
+        """Копия в LRU живёт не дольше ключа в хранилище."""
+        self.first.shared.set('key', 'value', 0.2)
+        self.assertEqual(self.second.get('key'), 'value')
+        time.sleep(0.3)
+        self.assertIsNone(self.second.get('key'))
+
+    def test_timeout(self):
+        """Истёкший ключ не возвращается ни из LRU, ни из хранилища."""
+        self.first.set('key', 'value', 0)
+        self.assertIsNone(self.first.get('key'))
+        self.assertIsNone(self.second.get('key'))
+
+
+class FetchTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_computed_once(self):
+        """Свежее значение считается один раз."""
+        self.assertEqual(fetch('key', self.compute, 60), 1)
+        self.assertEqual(fetch('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_version(self):
+        """Запись другой версии пересчитывается."""
+        fetch('key', self.compute, 60, version=1)
+        self.assertEqual(fetch('key', self.compute, 60, version=2), 2)
+
+    def test_stale_while_locked(self):
+        """Пока другой запрос пересчитывает, отдаётся прежняя копия."""
+        cache.set('key', Entry('old', None, 1, time.time() - 1))
+        cache.add(lock_key('key'), True)
+        self.assertEqual(fetch('key', self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+
+    @mock.patch('core.cache.WAIT_TIME', 0)
+    def test_no_copy_while_locked(self):
+        """Без копии запрос не ждёт бесконечно и считает сам."""
+        cache.add(lock_key('key'), True)
+        self.assertEqual(fetch('key', self.compute, 60), 1)
+
+    @mock.patch('core.cache.WAIT_TIME', 0)
+    def test_no_old_version_while_locked(self):
+        """Копия прежнего поколения не отдаётся, даже если пересчёт занят."""
+        cache.set('key', Entry('old', 1, 1, time.time() + 60))
+        cache.add(lock_key('key'), True)
+        self.assertEqual(fetch('key', self.compute, 60, version=2), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_refresh_early(self):
+        """Ранний пересчёт тем вероятнее, чем ближе срок."""
+        now = time.time()
+        self.assertFalse(refresh_early(Entry(1, None, 0.1, now + 3600)))
+        self.assertTrue(refresh_early(Entry(1, None, 0.1, now - 1)))
+        with mock.patch('core.cache.random.random', return_value=0.999999):
+            self.assertTrue(refresh_early(Entry(1, None, 1, now + 5)))
+
+    def test_tests_own_store(self):
+        """Тесты не делят файл кэша с сервером и другими запусками."""
+        location = settings.CACHES['shared']['LOCATION']
+        self.assertTrue(location.startswith(settings.TEST_DIR))
+        self.assertNotEqual(
+            os.path.dirname(location), tempfile.gettempdir())
+
+    def test_uncacheable(self):
+        """Uncacheable не сохраняет результат и снимает блокировку."""
+        def compute():
+            raise Uncacheable
+
+        with self.assertRaises(Uncacheable):
+            fetch('key', compute, 60)
+        self.assertIsNone(cache.get('key'))
+        self.assertIsNone(cache.get(lock_key('key')))
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_same_content_same_file(self):
+        """Одинаковое содержимое хранится одним файлом под именем-хэшем."""
+        first = self.storage.save('posts/a.JPG', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        other = self.storage.save('posts/a.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith('posts/'))
+        self.assertTrue(first.endswith('.jpg'))
+        self.assertTrue(is_hashed(first))
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.storage.path(first)))),
+            [os.path.basename(first)])
+
+    def test_media_headers(self):
+        """Файлы с хэшем в имени отдаются с заголовком immutable."""
+        hashed = self.storage.save('posts/a.gif', ContentFile(b'gif'))
+        plain = 'posts/plain.gif'
+        self.storage._save(plain, ContentFile(b'gif'))
+        factory = RequestFactory()
+        response = media(factory.get('/'), hashed, self.location)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = media(factory.get('/'), plain, self.location)
+        self.assertFalse(response.has_header('Cache-Control'))
+
+
+class EventsTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        events = override_settings(
+            EVENTS_PATH=os.path.join(directory, 'events.sqlite3'),
+            EVENTS_HEARTBEAT=2, EVENTS_POLL_INTERVAL=0.05)
+        events.enable()
+        self.addCleanup(events.disable)
+
+    def open(self, topics, last_id=None):
+        events = stream(topics, last_id)
+        self.addCleanup(events.close)
+        self.assertTrue(next(events).startswith('retry:'))
+        return events
+
+    def test_publish_to_topic(self):
+        """Подписчик получает события своей темы с id для переподключения."""
+        events = self.open(['group:cats'])
+        publish([('global', 'post', {'id': 1}),
+                 ('group:cats', 'post', {'id': 1})])
+        self.assertEqual(
+            next(events), 'id: 2\nevent: post\ndata: {"id": 1}\n\n')
+        self.assertEqual(get_hub().subscribers(), 1)
+        events.close()
+        self.assertEqual(get_hub().subscribers(), 0)
+
+    def test_heartbeat(self):
+        events = self.open(['global'])
+        with override_settings(EVENTS_HEARTBEAT=0.01):
+            self.assertEqual(next(events), ': ping\n\n')
+
+    def test_replay_after_last_event_id(self):
+        """По Last-Event-ID досылается пропущенное, без повторов."""
+        publish([('global', 'post', {'id': number}) for number in range(3)])
+        events = self.open(['global'], last_id=1)
+        self.assertTrue(next(events).startswith('id: 2\n'))
+        self.assertTrue(next(events).startswith('id: 3\n'))
+        publish([('global', 'post', {'id': 3})])
+        self.assertTrue(next(events).startswith('id: 4\n'))
+
+    def test_lost_events_reset(self):
+        """Если журнала с Last-Event-ID уже нет, клиент получает reset."""
+        publish([('global', 'post', {'id': 1})])
+        events = self.open(['global'], last_id=100)
+        self.assertTrue(next(events).startswith('event: reset'))
+
+    @override_settings(EVENTS_QUEUE_LIMIT=1)
+    def test_slow_subscriber_closed(self):
+        hub = get_hub()
+        subscription = hub.subscribe(['global'])
+        hub.dispatch([Event(number, 'global', 'post', '{}')
+                      for number in (1, 2)])
+        self.assertEqual(subscription.get(0).id, 1)
+        self.assertIs(subscription.get(0), CLOSED)
+        self.assertEqual(hub.subscribers(), 0)
@@ -1,4 +1,12 @@
+from django.conf import settings
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from .storage import is_hashed
+
+# Год: столько браузеры и прокси хранят файлы с хэшем в имени.
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,15 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def media(request, path, document_root=None):
+    """Раздаёт MEDIA_ROOT в разработке, как static.serve.
+
+    Файлы с хэшем в имени не меняются, их не нужно перепроверять.
+    """
+    response = serve(request, path, document_root or settings.MEDIA_ROOT)
+    if is_hashed(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
@@ -1,6 +1,31 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
 from .models import Post, Group, Comment, Follow
+from .search import matching
+from .utils import CursorPaginator, count_key
+
+
+class PageAutocompleteSelect(AutocompleteSelect):
+    """Автокомплит, которому можно заранее дать выбранный объект.
+
+    В списке постов группа уже загружена через list_select_related,
+    и запрос за её подписью на каждую строку не нужен.
+    """
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        if selected is None or {str(v) for v in value} != {str(selected.pk)}:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, selected.pk,
+            self.choices.field.label_from_instance(selected),
+            True, len(options)))
+        return [(None, options, 0)]
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,13 +36,58 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
+    list_select_related = ('author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
+    # Второй COUNT(*) по всей таблице ради «из N всего» не нужен.
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        # Без фильтров постов столько же, сколько в ленте на главной:
+        # берём её закэшированный счётчик, который сбрасывают сигналы.
+        key = None if queryset.query.where else count_key('index')
+        return CursorPaginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page, count_key=key)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', PageAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+
+        class PageFormSet(formset):
+            def _construct_form(self, i, **kwargs):
+                form = super()._construct_form(i, **kwargs)
+                for name, field in form.fields.items():
+                    widget = getattr(field.widget, 'widget', field.widget)
+                    if isinstance(widget, PageAutocompleteSelect):
+                        widget.selected = getattr(form.instance, name)
+                return form
+
+        return PageFormSet
+
+    def get_search_results(self, request, queryset, search_term):
+        # Тот же индекс FTS5, что и у поиска на сайте, вместо LIKE '%...%'.
+        if not search_term.strip():
+            return queryset, False
+        return matching(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    search_fields = ('title', 'slug')
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment)
 admin.site.register(Follow)
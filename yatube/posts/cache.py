@@ -0,0 +1,284 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import Uncacheable, fetch, store
+from .models import Group
+
+CARD_STATS_KEYS = ('card_stats:hits', 'card_stats:misses')
+# Попадания и промахи копятся в процессе и уходят в кэш не чаще раза
+# в CARD_STATS_FLUSH секунд, а не двумя записями на каждой странице.
+CARD_STATS_FLUSH = 60
+# Заголовки ответа, которые кэшируются вместе со страницей.
+CACHED_HEADERS = ('X-Next-Cursor',)
+# Параметры запроса, которые читают ленты; остальные в ключ не входят.
+PAGE_PARAMS = ('page', 'after', 'before', 'fragment')
+
+
+def new_version():
+    """Версия, которая раньше не встречалась, даже если ключ вытеснен."""
+    return time.time_ns()
+
+
+def current_versions(keys):
+    """Текущие версии по ключам; недостающие создаются заново."""
+    keys = set(keys)
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys - versions.keys()}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def version_key(kind, pk):
+    return f'card_version:{kind}:{pk}'
+
+
+def bump_card(kind, pk):
+    """Делает устаревшими карточки поста, группы или автора."""
+    cache.set(version_key(kind, pk), new_version(), None)
+
+
+def generation_key(scope):
+    return f'page_gen:{scope}'
+
+
+def bump_pages(*scopes):
+    """Сменяет поколение областей: global, group:<slug>, author:<username>."""
+    cache.set_many(
+        {generation_key(scope): new_version() for scope in scopes}, None)
+
+
+def viewer(request):
+    return request.user.pk if request.user.is_authenticated else 'anon'
+
+
+def post_scopes(post, *group_ids):
+    """Области страниц, на которых виден пост."""
+    group_ids = {post.group_id, *group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    return ['global', f'post:{post.pk}', f'author:{post.author.username}',
+            *(f'group:{slug}' for slug in slugs)]
+
+
+def incr(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, delta, None)
+
+
+_card_counts = [0, 0]
+_card_flushed = time.monotonic()
+_card_lock = threading.Lock()
+
+
+def count_cards(hits, misses):
+    with _card_lock:
+        _card_counts[0] += hits
+        _card_counts[1] += misses
+        due = time.monotonic() - _card_flushed >= CARD_STATS_FLUSH
+    if due:
+        flush_card_stats()
+
+
+def flush_card_stats():
+    """Переносит накопленные процессом попадания и промахи в кэш."""
+    global _card_flushed
+    with _card_lock:
+        pending = tuple(_card_counts)
+        _card_counts[:] = [0, 0]
+        _card_flushed = time.monotonic()
+    for key, delta in zip(CARD_STATS_KEYS, pending):
+        if delta:
+            incr(key, delta)
+
+
+def card_stats():
+    """Попадания и промахи кэша карточек с момента последнего сброса.
+
+    Другие процессы досылают свои счётчики с задержкой до CARD_STATS_FLUSH.
+    """
+    flush_card_stats()
+    values = cache.get_many(CARD_STATS_KEYS)
+    return tuple(values.get(key, 0) for key in CARD_STATS_KEYS)
+
+
+def reset_card_stats():
+    global _card_flushed
+    with _card_lock:
+        _card_counts[:] = [0, 0]
+        _card_flushed = time.monotonic()
+    cache.delete_many(CARD_STATS_KEYS)
+
+
+def attach_cards(posts, template, prepare=None, eager=None):
+    """Кладёт в post.card готовый HTML карточки для каждого поста.
+
+    Версии и карточки читаются двумя get_many на всю страницу,
+    отрисовываются только карточки, которых нет в кэше; prepare(posts)
+    один раз дозагружает для них данные, например картинки. Первые eager
+    (по умолчанию EAGER_CARDS) карточек страницы грузят картинку сразу,
+    остальные лениво.
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    sources = {
+        post.pk: [version_key('post', post.pk),
+                  version_key('author', post.author_id),
+                  version_key('group', post.group_id)]
+        for post in posts
+    }
+    versions = current_versions(
+        key for keys in sources.values() for key in keys)
+    if eager is None:
+        eager = settings.EAGER_CARDS
+    eager = {post.pk for post in posts[:eager]}
+    keys = {
+        post.pk: ':'.join(
+            ['card', template, str(post.pk)]
+            + [str(versions[key]) for key in sources[post.pk]]
+            + (['eager'] if post.pk in eager else []))
+        for post in posts
+    }
+    cached = cache.get_many(keys.values())
+    if prepare is not None:
+        missed = [post for post in posts if keys[post.pk] not in cached]
+        if missed:
+            prepare(missed)
+    fresh = {}
+    for post in posts:
+        key = keys[post.pk]
+        html = cached.get(key)
+        if html is None:
+            html = fresh[key] = render_to_string(
+                template, {'post': post, 'eager': post.pk in eager})
+        post.card = mark_safe(html)
+    if fresh:
+        cache.set_many(fresh, settings.CARD_CACHE_TIME)
+    count_cards(len(posts) - len(fresh), len(fresh))
+
+
+def remember(chunks, save):
+    """Отдаёт куски потока и сохраняет страницу, если он дошёл до конца."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    save(b''.join(parts))
+
+
+def page_meta(response):
+    """Content-Type и CACHED_HEADERS ответа, которые кэшируются с ним."""
+    headers = {
+        name: response[name] for name in CACHED_HEADERS
+        if response.has_header(name)
+    }
+    return response['Content-Type'], headers
+
+
+def cached_response(content, content_type, headers):
+    """Ответ из страницы, сохранённой вместе с page_meta."""
+    response = HttpResponse(content, content_type=content_type)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def store_streamed(response, key, version):
+    """Сохранит потоковую страницу, когда она целиком уйдёт клиенту."""
+    content_type, headers = page_meta(response)
+    response.streaming_content = remember(
+        response.streaming_content,
+        lambda content: store(
+            key, lambda: (content, content_type, headers),
+            settings.PAGE_CACHE_TIME, version))
+
+
+def cache_generations(*scopes, params=PAGE_PARAMS):
+    """Кэширует GET-страницу, пока не сменится поколение её областей.
+
+    Области задаются шаблонами вида 'group:{slug}' по аргументам view.
+    Страница хранится PAGE_CACHE_TIME отдельно для каждого пользователя
+    и общая для анонимов, вместе с Content-Type и CACHED_HEADERS. В ключ
+    входят только параметры запроса params, которые читает view: иначе
+    любой ?x=1, ?x=2… занимал бы в кэше новую страницу.
+    Устаревшую страницу пересчитывает один запрос, см. core.cache.fetch.
+    Потоковый ответ сохраняется, когда он целиком ушёл клиенту.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            versions = current_versions(
+                generation_key(scope.format(**kwargs)) for scope in scopes)
+            source = '\n'.join(
+                [view.__name__, str(viewer(request)), request.path]
+                + [f'{name}={value}' for name in params
+                   for value in request.GET.getlist(name)])
+            key = 'response:' + hashlib.md5(source.encode()).hexdigest()
+            version = sorted(versions.items())
+            response = None
+
+            def render():
+                nonlocal response
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    raise Uncacheable
+                if response.streaming:
+                    store_streamed(response, key, version)
+                    raise Uncacheable
+                return (response.content, *page_meta(response))
+
+            try:
+                content, content_type, headers = fetch(
+                    key, render, settings.PAGE_CACHE_TIME, version=version)
+            except Uncacheable:
+                return response
+            if response is not None:
+                return response
+            return cached_response(content, content_type, headers)
+        return wrapper
+    return decorator
+
+
+def conditional(*scopes):
+    """Отвечает 304, если области страницы не менялись.
+
+    ETag строится по поколениям областей, адресу, пользователю и сессии.
+    Область — шаблон по аргументам view или функция (request, **kwargs),
+    возвращающая список областей либо None, если страницы нет.
+    Last-Modified не отдаётся: с точностью до секунды и без пользователя
+    он разрешил бы 304 после смены поколения или нового входа.
+    """
+    def etag(request, *args, **kwargs):
+        names = []
+        for scope in scopes:
+            if not callable(scope):
+                names.append(scope.format(**kwargs))
+                continue
+            found = scope(request, **kwargs)
+            if found is None:
+                return None
+            names += found
+        versions = current_versions(generation_key(name) for name in names)
+        # Вход заново меняет ключ сессии и секрет CSRF: старая страница
+        # с формой отдала бы браузеру уже негодный csrf_token.
+        source = [str(viewer(request)), request.session.session_key or '',
+                  request.get_full_path()]
+        source += [f'{k}={v}' for k, v in sorted(versions.items())]
+        return hashlib.md5('\n'.join(source).encode()).hexdigest()
+
+    return condition(etag_func=etag)
@@ -0,0 +1,88 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+STATS_SOURCES = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'follower_count': (Follow, 'user'),
+    'following_count': (Follow, 'author'),
+}
+
+
+def count_of(model, field):
+    """Подзапрос: число строк model, у которых field указывает на OuterRef."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def bump(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя через F().
+
+    Если строки счётчиков ещё нет, её посчитает stats_for при чтении.
+    """
+    AuthorStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0))
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающую строку пересчитывает."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        reconcile(User.objects.filter(pk=user.pk))
+        user.stats = AuthorStats.objects.get(user=user)
+        return user.stats
+
+
+def reconcile(users=None, chunk_size=2000):
+    """Пересчитывает счётчики и исправляет расхождения.
+
+    Возвращает число исправленных строк AuthorStats и Post.
+    """
+    if users is None:
+        users = User.objects.all()
+    users = users.annotate(**{
+        f'real_{field}': count_of(model, lookup)
+        for field, (model, lookup) in STATS_SOURCES.items()
+    })
+    existing = set(
+        AuthorStats.objects.filter(user__in=users.values('pk'))
+        .values_list('user_id', flat=True))
+    fixed = 0
+    for user in users.select_related('stats').iterator(chunk_size):
+        real = {field: getattr(user, f'real_{field}')
+                for field in STATS_SOURCES}
+        if user.pk not in existing:
+            # Строку мог успеть создать параллельный запрос.
+            _, created = AuthorStats.objects.get_or_create(
+                user_id=user.pk, defaults=real)
+            fixed += created
+            continue
+        if any(getattr(user.stats, field) != value
+               for field, value in real.items()):
+            AuthorStats.objects.filter(user_id=user.pk).update(**real)
+            fixed += 1
+    drifted = (
+        Post.objects.annotate(real=count_of(Comment, 'post'))
+        .exclude(comments_count=F('real'))
+        .values_list('pk', 'real')
+    )
+    for pk, real in drifted.iterator(chunk_size):
+        Post.objects.filter(pk=pk).update(comments_count=real)
+        fixed += 1
+    return fixed
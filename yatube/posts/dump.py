@@ -0,0 +1,231 @@
+"""Потоковая выгрузка и загрузка содержимого сайта.
+
+Каждая модель пишется в свой файл <app>.<model>.ndjson.gz: по объекту
+JSON на строку, значения полей по attname. Строки читаются курсором
+по pk пачками, каждая пачка — отдельный короткий запрос, так что сайт
+пишет в базу и во время выгрузки; строки, созданные после её начала,
+достаются следующему запуску. После каждой пачки в checkpoint.json
+записывается последний pk и размер файла, так что прерванную выгрузку
+можно продолжить. Счётчики и ленты не выгружаются: после загрузки они
+пересчитываются (importing.rebuild).
+"""
+import datetime
+import gzip
+import json
+import os
+import resource
+import time
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+
+from .importing import batches, chunked, keep_dates, rebuild
+from .models import Comment, Follow, Group, Post, User
+
+# Порядок зависимостей: каждая модель ссылается только на предыдущие.
+MODELS = (User, Group, Post, Comment, Follow)
+CHECKPOINT = 'checkpoint.json'
+# Пересчитываются после загрузки, поэтому могут разойтись с файлом.
+REBUILT_FIELDS = {'comments_count'}
+
+
+class RestoreConflict(ValueError):
+    """В базе уже есть другая строка с тем же id или уникальным полем."""
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder обрезает время до миллисекунд, здесь оно целое."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def peak_rss():
+    """Пиковая память процесса в мегабайтах (ru_maxrss в Linux — КБ)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def file_name(model):
+    return f'{model._meta.label_lower}.ndjson.gz'
+
+
+def attnames(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+class Checkpoint:
+    """Прогресс выгрузки: модель -> (последний pk, размер файла)."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CHECKPOINT)
+        self.state = {}
+        if os.path.exists(self.path):
+            with open(self.path) as file_:
+                self.state = json.load(file_)
+
+    def get(self, model):
+        return self.state.get(model._meta.label_lower, (None, 0))
+
+    def save(self, model, last_pk, size):
+        self.state[model._meta.label_lower] = (last_pk, size)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file_:
+            json.dump(self.state, file_)
+        os.replace(temporary, self.path)
+
+
+def chunks(queryset, last_pk, chunk_size):
+    """Пачки строк после last_pk, каждая своим запросом.
+
+    iterator() держал бы один SELECT, а с ним и блокировку чтения
+    SQLite, открытым до конца модели.
+    """
+    pk = queryset.model._meta.pk.attname
+    while True:
+        page = queryset
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][pk]
+
+
+def dump_model(model, directory, checkpoint, chunk_size=2000, until=None):
+    """Дописывает в файл модели строки после сохранённого pk до until.
+
+    Каждая пачка — отдельный член gzip: файл, обрезанный до размера из
+    checkpoint, остаётся целым архивом. Возвращает число строк.
+    """
+    last_pk, size = checkpoint.get(model)
+    queryset = model._base_manager.order_by('pk').values(*attnames(model))
+    if until is not None:
+        queryset = queryset.filter(pk__lte=until)
+    path = os.path.join(directory, file_name(model))
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as file_:
+        file_.truncate(size)
+        file_.seek(size)
+        for rows in chunks(queryset, last_pk, chunk_size):
+            with gzip.GzipFile(fileobj=file_, mode='wb') as archive:
+                for row in rows:
+                    archive.write(json.dumps(
+                        row, cls=DumpEncoder,
+                        ensure_ascii=False).encode() + b'\n')
+            file_.flush()
+            os.fsync(file_.fileno())
+            written += len(rows)
+            checkpoint.save(
+                model, rows[-1][model._meta.pk.attname], file_.tell())
+    return written
+
+
+def read_model(model, directory):
+    """Строки файла модели, по одной, без чтения файла целиком."""
+    path = os.path.join(directory, file_name(model))
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+def stored_rows(model, pks):
+    """pk -> строка базы в том виде, в каком её пишет выгрузка."""
+    found = {}
+    for chunk in chunked(pks):
+        rows = model._base_manager.filter(pk__in=chunk).values(
+            *attnames(model))
+        for row in rows:
+            found[row[model._meta.pk.attname]] = json.loads(
+                json.dumps(row, cls=DumpEncoder))
+    return found
+
+
+def same_row(stored, row):
+    return ({name: value for name, value in stored.items()
+             if name not in REBUILT_FIELDS}
+            == {name: value for name, value in row.items()
+                if name not in REBUILT_FIELDS})
+
+
+def restore_model(model, directory, batch_size=1000):
+    """Загружает файл модели пачками через bulk_create; возвращает число.
+
+    Строки, которые уже есть в базе в том же виде, пропускаются, поэтому
+    прерванную загрузку можно просто повторить. Другая строка с тем же
+    id или уникальным полем — RestoreConflict: иначе посты из выгрузки
+    достались бы чужому пользователю.
+    """
+    label = model._meta.label_lower
+    pk = model._meta.pk.attname
+    restored = 0
+    for rows in batches(read_model(model, directory), batch_size):
+        stored = stored_rows(model, [row[pk] for row in rows])
+        for row in rows:
+            if row[pk] in stored and not same_row(stored[row[pk]], row):
+                raise RestoreConflict(
+                    f'{label} id={row[pk]} уже есть в базе и отличается '
+                    f'от выгрузки')
+        new = [model(**row) for row in rows if row[pk] not in stored]
+        try:
+            with transaction.atomic():
+                model._base_manager.bulk_create(new)
+        except IntegrityError as error:
+            raise RestoreConflict(f'{label}: {error}')
+        restored += len(new)
+    return restored
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def dump(directory, chunk_size=2000, report=None):
+    """Выгружает MODELS; report(модель, строк, секунд) после каждой."""
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = Checkpoint(directory)
+    # Без общей транзакции: она держала бы блокировку чтения SQLite всю
+    # выгрузку, и запись на сайте падала бы с «database is locked».
+    # Вместо снимка — границы pk на начало выгрузки: строки, добавленные
+    # во время неё, ссылались бы на ещё не выгруженные, и они достаются
+    # следующему запуску (pk в SQLite растут, AUTOINCREMENT).
+    horizons = {
+        model: model._base_manager.aggregate(last=Max('pk'))['last'] or 0
+        for model in MODELS
+    }
+    for model in MODELS:
+        count, elapsed = timed(
+            dump_model, model, directory, checkpoint, chunk_size,
+            horizons[model])
+        if report is not None:
+            report(model, count, elapsed)
+
+
+def restore(directory, batch_size=1000, report=None):
+    """Загружает MODELS по порядку, проверяя внешние ключи в конце."""
+    tables = [model._meta.db_table for model in MODELS]
+    with keep_dates(), connection.constraint_checks_disabled():
+        for model in MODELS:
+            count, elapsed = timed(
+                restore_model, model, directory, batch_size)
+            if report is not None:
+                report(model, count, elapsed)
+    connection.check_constraints(table_names=tables)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), MODELS):
+            cursor.execute(sql)
+    authors = list(
+        Follow.objects.order_by().values_list('author_id', flat=True)
+        .distinct()
+    )
+    _, elapsed = timed(rebuild, authors)
+    if report is not None:
+        report(None, 0, elapsed)
@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import bump_pages
+from .models import AuthorStats, FeedEntry, Follow, Post
+from .utils import CursorPaginator, count_key
+
+# Поколение постов всех авторов, которые не рассылаются по лентам.
+PULL_SCOPE = 'feed:pull'
+
+
+def feed_scope(user_id):
+    """Поколение ленты подписок пользователя, см. posts.cache."""
+    return f'feed:{user_id}'
+
+
+def followers_count(author_id):
+    return (
+        AuthorStats.objects.filter(user_id=author_id)
+        .values_list('following_count', flat=True).first() or 0
+    )
+
+
+def pull_authors(user):
+    """Авторы из подписок user, чьи посты не рассылаются по лентам."""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__following_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values_list('author_id', flat=True)
+    )
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора.
+
+    Если подписчиков больше FEED_FANOUT_LIMIT, пост никуда не пишется:
+    такие авторы читаются напрямую, см. FollowFeedPaginator.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) > limit:
+        bump_pages(PULL_SCOPE)
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True,
+    )
+    cache.delete_many([count_key('feed', user_id) for user_id in followers])
+    if followers:
+        bump_pages(*(feed_scope(user_id) for user_id in followers))
+
+
+def forget(post):
+    """Сбрасывает счётчики лент, из которых ушёл удалённый пост.
+
+    Как и fan_out, авторов больше чем с FEED_FANOUT_LIMIT подписчиками
+    пропускает: их посты в ленты не рассылались.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) <= limit:
+        cache.delete_many(
+            [count_key('feed', user_id) for user_id in followers])
+
+
+def fill(author_id, user_ids, batch_size=1000):
+    """Кладёт все посты автора в ленты user_ids.
+
+    Лента должна содержать все посты, иначе её дальние страницы пусты,
+    а число страниц, посчитанное по подпискам, больше настоящего. Посты
+    читаются по pk пачками, записей за раз не больше batch_size.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    step = max(1, batch_size // len(user_ids))
+    last_pk = 0
+    while True:
+        posts = list(
+            Post.objects.filter(author_id=author_id, pk__gt=last_pk)
+            .order_by('pk').values_list('pk', 'pub_date')[:step]
+        )
+        if not posts:
+            return
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        last_pk = posts[-1][0]
+
+
+def backfill(follow):
+    """Заполняет ленту нового подписчика постами автора."""
+    cache.delete(count_key('feed', follow.user_id))
+    bump_pages(feed_scope(follow.user_id))
+    if followers_count(follow.author_id) > settings.FEED_FANOUT_LIMIT:
+        return
+    fill(follow.author_id, [follow.user_id])
+
+
+def rebuild(author_ids, batch_size=1000):
+    """Заполняет ленты подписчиков авторов их постами.
+
+    Нужна после массовой загрузки: bulk_create не вызывает ни fan_out,
+    ни backfill. Авторы, которые не рассылаются по лентам, пропускаются.
+    """
+    for author_id in author_ids:
+        if followers_count(author_id) > settings.FEED_FANOUT_LIMIT:
+            continue
+        followers = (
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)
+        )
+        fill(author_id, followers, batch_size)
+
+
+def restore(author_id):
+    """Заполняет ленты подписчиков автора, вернувшегося к рассылке.
+
+    Посты, вышедшие, пока подписчиков было больше FEED_FANOUT_LIMIT,
+    есть только в Post, а при чтении автор больше не подмешивается.
+    """
+    rebuild([author_id])
+    followers = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+    cache.delete_many([count_key('feed', user_id) for user_id in followers])
+    if followers:
+        bump_pages(*(feed_scope(user_id) for user_id in followers))
+
+
+def prune(follow):
+    """Убирает из ленты посты автора, от которого отписались."""
+    cache.delete(count_key('feed', follow.user_id))
+    bump_pages(feed_scope(follow.user_id))
+    FeedEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id,
+    ).delete()
+    if followers_count(follow.author_id) == settings.FEED_FANOUT_LIMIT:
+        # После коммита: при удалении автора его посты к тому времени
+        # уже удалены и в ленты не попадут.
+        transaction.on_commit(lambda: restore(follow.author_id))
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """Лента подписок: чтение диапазона из FeedEntry по индексу.
+
+    Посты авторов, которые не рассылаются по лентам, выбираются тем же
+    курсором напрямую из Post и сливаются с записями ленты.
+    """
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def fetch(self, cursor, newer, limit):
+        rows = self.feed_rows(cursor, newer, limit)
+        authors = pull_authors(self.user)
+        if not authors:
+            return rows
+        # По одному запросу на автора: каждый читает диапазон индекса
+        # (author, -pub_date, -id), а IN по нескольким авторам сортировал
+        # бы все их посты.
+        for author_id in authors:
+            rows += self.author_rows(author_id, cursor, newer, limit)
+        unique = {self.cursor_key(row): row for row in rows}
+        return [
+            unique[key]
+            for key in sorted(unique, reverse=not newer)[:limit]
+        ]
+
+    def feed_rows(self, cursor, newer, limit):
+        """Посты страницы из записей ленты."""
+        entries = self.keyset(
+            FeedEntry.objects.filter(user=self.user)
+            .select_related('post__author', 'post__group'),
+            cursor, newer, pk_field='post_id',
+        )[:limit]
+        return [entry.post for entry in entries]
+
+    def author_rows(self, author_id, cursor, newer, limit):
+        """Посты страницы автора, который не рассылается по лентам."""
+        return list(self.keyset(
+            Post.objects.filter(author_id=author_id)
+            .select_related('author', 'group'),
+            cursor, newer,
+        )[:limit])
@@ -1,4 +1,5 @@
 from django import forms
+from .images import ImageRejected, prepare_upload
 from .models import Post, Comment
 
 
@@ -15,6 +16,16 @@ class PostForm(forms.ModelForm):
             'group': ('группа'),
         }
 
+    def clean_image(self):
+        """Уменьшает новую картинку и убирает из неё метаданные."""
+        image = self.cleaned_data.get('image')
+        if not image or 'image' not in self.changed_data:
+            return image
+        try:
+            return prepare_upload(image)
+        except ImageRejected as error:
+            raise forms.ValidationError(str(error))
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,114 @@
+"""Подготовка загруженных картинок перед сохранением и их удаление.
+
+Оригинал уменьшается до IMAGE_MAX_SIZE по длинной стороне, поворачивается
+по EXIF и сохраняется без метаданных. JPEG декодируется сразу в
+уменьшенном масштабе (draft), так что память ограничена размером
+результата, а не исходника.
+
+Одинаковые картинки хранятся одним файлом (core.storage), поэтому файл
+удаляется, только когда на него не ссылается ни один пост.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import is_hashed
+from .models import Post
+
+# Форматы, которые сохраняются повторно; остальные остаются как есть.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+    'GIF': {},
+}
+
+
+class ImageRejected(ValueError):
+    """Картинку нельзя принять: слишком много пикселей или битый файл."""
+
+
+def open_image(upload):
+    """Открывает картинку, не декодируя пиксели, и проверяет её размер."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError as error:
+        raise ImageRejected(str(error))
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageRejected(
+            f'Картинка {width}x{height} больше '
+            f'{settings.IMAGE_MAX_PIXELS} пикселей.')
+    return image
+
+
+def needs_processing(image):
+    """Нужно ли пересохранять картинку."""
+    if getattr(image, 'is_animated', False):
+        # Анимацию не трогаем: уменьшение оставило бы один кадр.
+        return False
+    if image.format not in SAVE_OPTIONS:
+        return False
+    too_large = max(image.size) > settings.IMAGE_MAX_SIZE
+    return too_large or bool(image.getexif()) or 'exif' in image.info
+
+
+def prepare_upload(upload):
+    """Уменьшенная копия upload без EXIF или сам upload, если она не нужна.
+
+    Имя и формат файла сохраняются. Бросает ImageRejected.
+    """
+    image = open_image(upload)
+    if not needs_processing(image):
+        upload.seek(0)
+        return upload
+    limit = (settings.IMAGE_MAX_SIZE, settings.IMAGE_MAX_SIZE)
+    format_ = image.format
+    # draft работает только для JPEG: декодер сразу уменьшает в 2-8 раз.
+    image.draft('RGB', limit)
+    try:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(limit, reducing_gap=3.0)
+    except (OSError, SyntaxError) as error:
+        raise ImageRejected(str(error))
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.info.pop('exif', None)
+    options = dict(SAVE_OPTIONS[format_])
+    if 'icc_profile' in image.info:
+        options['icc_profile'] = image.info['icc_profile']
+    buffer = io.BytesIO()
+    image.save(buffer, format_, **options)
+    return SimpleUploadedFile(
+        upload.name, buffer.getvalue(),
+        content_type=Image.MIME.get(format_, upload.content_type),
+    )
+
+
+def release(name):
+    """Удаляет файл name и его миниатюры, если он больше не нужен.
+
+    Файлы со старыми именами, загруженные до хранилища по хэшу,
+    принадлежат одному посту и не удаляются, как и раньше.
+    """
+    if not name or not is_hashed(name):
+        return
+    storage = Post._meta.get_field('image').storage
+    # Под блокировкой хранилища: иначе параллельная загрузка того же
+    # содержимого увидит файл на месте, а мы его тут же удалим.
+    with storage.locked():
+        if (Post.objects.filter(image=name).exists()
+                or storage.is_uploading(name)):
+            return
+        default.backend.delete(ImageFile(name, storage))
+
+
+def settle(name):
+    """Вызывается после коммита поста с картинкой name."""
+    if name and is_hashed(name):
+        Post._meta.get_field('image').storage.settle(name)
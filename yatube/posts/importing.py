@@ -0,0 +1,313 @@
+"""Массовая загрузка постов, комментариев и подписок из NDJSON или CSV.
+
+Строки читаются потоком и пишутся bulk_create пачками, каждая в своей
+транзакции. bulk_create не шлёт сигналов, поэтому счётчики, ленты и кэш
+страниц не обновляются на каждой строке, а пересчитываются один раз в
+конце (rebuild). Память ограничена пачкой и словарями пользователей и
+групп, которые встретились во входных данных.
+"""
+import csv
+import io
+import json
+import sys
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed
+from .models import Comment, Follow, Group, Post, User
+
+# Сколько значений подставлять в один IN: предел переменных SQLite.
+LOOKUP_CHUNK = 500
+
+
+class RowError(ValueError):
+    """Строку нельзя загрузить: нет автора, группы или поста."""
+
+
+class BadLine(dict):
+    """Строка, которую не удалось разобрать: пустая, с ошибкой в error."""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+
+def read_rows(stream, format_):
+    """Словари строк из текстового потока в формате ndjson или csv.
+
+    Вместо неразборчивой строки ndjson отдаётся BadLine: import_rows
+    пропускает её, как и любую другую ошибочную строку.
+    """
+    if format_ == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield BadLine(RowError(f'Неверный JSON: {error}'))
+            continue
+        if not isinstance(row, dict):
+            yield BadLine(RowError('Строка — не объект JSON'))
+            continue
+        yield row
+
+
+def open_input(path, encoding='utf-8'):
+    """Текстовый поток файла path; '-' — стандартный ввод."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding=encoding)
+    return open(path, encoding=encoding, newline='')
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def chunked(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class Lookup:
+    """Значение поля -> id, догружается из базы только для новых ключей.
+
+    create(keys) создаёт недостающие строки; без него неизвестный ключ
+    остаётся без id.
+    """
+
+    def __init__(self, model, field, create=None):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.ids = {}
+        self.missing = set()
+
+    def load(self, keys):
+        new = {key for key in keys
+               if key and key not in self.ids and key not in self.missing}
+        if not new:
+            return
+        self.fetch(new)
+        unknown = new - self.ids.keys()
+        if unknown and self.create is not None:
+            self.create(unknown)
+            self.fetch(unknown)
+            unknown -= self.ids.keys()
+        self.missing |= unknown
+
+    def fetch(self, keys):
+        for chunk in chunked(keys):
+            self.ids.update(
+                self.model.objects.filter(**{f'{self.field}__in': chunk})
+                .values_list(self.field, 'pk'))
+
+    def __getitem__(self, key):
+        try:
+            return self.ids[key]
+        except KeyError:
+            raise RowError(f'{self.model.__name__} {key!r} не найден')
+
+
+def create_users(usernames):
+    """Авторы, которых ещё нет, без пароля: войти можно после сброса."""
+    User.objects.bulk_create(
+        User(username=username, password=make_password(None))
+        for username in usernames)
+
+
+def parse_date(value):
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise RowError(f'Неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+@contextmanager
+def keep_dates():
+    """Даёт bulk_create записать даты из файла вместо auto_now_add."""
+    fields = [Post._meta.get_field('pub_date'),
+              Comment._meta.get_field('created')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def with_date(obj, field, value):
+    setattr(obj, field, parse_date(value) or timezone.now())
+    return obj
+
+
+class Importer(ABC):
+    """Загрузка строк одного вида; подклассы строят объекты модели."""
+    model = None
+    usernames = ()
+
+    def __init__(self, users):
+        self.users = users
+        self.authors = set()
+
+    def prepare(self, rows):
+        """Догружает всё, на что ссылается пачка, парой запросов."""
+        self.users.load(row.get(field) for row in rows
+                        for field in self.usernames)
+
+    @abstractmethod
+    def build(self, row):
+        """Объект модели из строки; бросает RowError."""
+
+    def save(self, objects):
+        self.model.objects.bulk_create(objects)
+
+
+class PostImporter(Importer):
+    model = Post
+    usernames = ('author',)
+
+    def __init__(self, users):
+        super().__init__(users)
+        self.groups = Lookup(Group, 'slug')
+
+    def prepare(self, rows):
+        super().prepare(rows)
+        self.groups.load(row.get('group') for row in rows)
+        # Явные id пачки, которые уже заняты: повторная загрузка их
+        # пропускает. Прошлые пачки уже в базе, так что хватает запроса.
+        ids = {int(row['id']) for row in rows
+               if str(row.get('id', '')).isdigit()}
+        self.taken = set()
+        for chunk in chunked(ids):
+            self.taken.update(Post.objects.filter(
+                pk__in=chunk).values_list('pk', flat=True))
+
+    def build(self, row):
+        post = Post(
+            text=row['text'],
+            author_id=self.users[row['author']],
+            group_id=self.groups[row['group']] if row.get('group') else None,
+            image=row.get('image') or '',
+        )
+        if row.get('id'):
+            post.pk = int(row['id'])
+            if post.pk in self.taken:
+                raise RowError(f'Пост {post.pk} уже есть')
+            self.taken.add(post.pk)
+        self.authors.add(post.author_id)
+        return with_date(post, 'pub_date', row.get('pub_date'))
+
+
+class CommentImporter(Importer):
+    model = Comment
+    usernames = ('author',)
+
+    def prepare(self, rows):
+        super().prepare(rows)
+        ids = {int(row['post']) for row in rows
+               if str(row.get('post', '')).isdigit()}
+        self.posts = set()
+        for chunk in chunked(ids):
+            self.posts.update(Post.objects.filter(
+                pk__in=chunk).values_list('pk', flat=True))
+
+    def build(self, row):
+        post_id = int(row['post'])
+        if post_id not in self.posts:
+            raise RowError(f'Пост {post_id} не найден')
+        comment = Comment(
+            post_id=post_id,
+            author_id=self.users[row['author']],
+            text=row['text'],
+        )
+        return with_date(comment, 'created', row.get('created'))
+
+
+class FollowImporter(Importer):
+    model = Follow
+    usernames = ('user', 'author')
+
+    def build(self, row):
+        follow = Follow(user_id=self.users[row['user']],
+                        author_id=self.users[row['author']])
+        if follow.user_id == follow.author_id:
+            raise RowError('Нельзя подписаться на себя')
+        self.authors.add(follow.author_id)
+        return follow
+
+    def save(self, objects):
+        self.model.objects.bulk_create(objects, ignore_conflicts=True)
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
+
+
+def import_rows(kind, rows, batch_size=1000, users=None, on_batch=None,
+                on_error=None, authors=None):
+    """Загружает строки вида kind; возвращает (загружено, пропущено, авторы).
+
+    authors — id авторов, чьи ленты подписчиков нужно пересобрать; если
+    передать свой set, он пополняется после каждой пачки и пригодится,
+    даже когда загрузка оборвалась ошибкой.
+    on_batch(загружено, пропущено) вызывается после каждой пачки,
+    on_error(номер строки, ошибка) — на каждую пропущенную строку.
+    """
+    if users is None:
+        users = Lookup(User, 'username')
+    importer = IMPORTERS[kind](users)
+    if authors is not None:
+        importer.authors = authors
+    imported = skipped = 0
+    number = 0
+    with keep_dates():
+        for rows in batches(rows, batch_size):
+            importer.prepare(rows)
+            objects = []
+            for row in rows:
+                number += 1
+                try:
+                    if isinstance(row, BadLine):
+                        raise row.error
+                    objects.append(importer.build(row))
+                except (RowError, KeyError, TypeError, ValueError) as error:
+                    skipped += 1
+                    if on_error is not None:
+                        on_error(number, error)
+            with transaction.atomic():
+                importer.save(objects)
+            imported += len(objects)
+            if on_batch is not None:
+                on_batch(imported, skipped)
+    return imported, skipped, importer.authors
+
+
+def rebuild(authors):
+    """Один пересчёт вместо побочных эффектов каждой строки."""
+    counters.reconcile()
+    feed.rebuild(authors)
+    cache.clear()
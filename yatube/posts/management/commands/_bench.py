@@ -0,0 +1,51 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+
+from posts.models import Post
+
+
+@contextmanager
+def rollback():
+    """Замеры идут в транзакции, которая в конце откатывается."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timeit(func, repeat=5):
+    """Медиана времени выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def make_posts(count, batch_size=10000, **fields):
+    """Создаёт count постов пачками по batch_size."""
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        Post.objects.bulk_create(
+            Post(text=f'Пост номер {created + i}', **fields)
+            for i in range(size)
+        )
+        created += size
+
+
+def measure(client, url, repeat=5, **params):
+    """(без кэша мс, из кэша мс, размер ответа КБ) для GET url."""
+    def cold():
+        cache.clear()
+        return client.get(url, params)
+
+    response = cold()
+    assert response.status_code == 200, (url, response.status_code)
+    cold_time = timeit(cold, repeat)
+    warm_time = timeit(lambda: client.get(url, params), repeat)
+    return cold_time, warm_time, len(response.content) / 1024
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group
+from ._bench import make_posts, rollback, timeit
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет время и число запросов списка постов в админке '
+            'на большой таблице. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rollback():
+            admin = User.objects.create_superuser(
+                'bench_admin', 'bench@example.com', 'password')
+            groups = Group.objects.bulk_create(
+                Group(title=f'Группа {i}', slug=f'bench-{i}',
+                      description='Группа для замера')
+                for i in range(options['groups']))
+            group = Group.objects.get(slug=groups[0].slug)
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            make_posts(options['posts'], options['batch_size'],
+                       author=admin, group=group)
+            client = Client()
+            client.force_login(admin)
+            url = reverse('admin:posts_post_changelist')
+            self.stdout.write(f'{"страница":>28} {"мс":>8} {"запросов":>9}')
+            for title, params in (
+                ('первая', {}),
+                ('сотая', {'p': 99}),
+                ('поиск', {'q': 'номер 12345'}),
+                ('дата: год', {'pub_date__year': 2026}),
+            ):
+                client.get(url, params)
+                queries = []
+                with connection.execute_wrapper(
+                        lambda execute, sql, *args: queries.append(sql)
+                        or execute(sql, *args)):
+                    response = client.get(url, params)
+                assert response.status_code == 200, response.status_code
+                elapsed = timeit(
+                    lambda: client.get(url, params), options['repeat'])
+                self.stdout.write(
+                    f'{title:>28} {elapsed:>8.1f} {len(queries):>9}')
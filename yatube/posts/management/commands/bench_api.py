@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from posts import feed
+from posts.models import Follow, Group
+from ._bench import make_posts, measure, rollback
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время ответа JSON API и HTML-страниц лент: без кэша '
+            'и из кэша. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rollback():
+            author = User.objects.create_user(username='bench_api')
+            reader = User.objects.create_user(username='bench_api_reader')
+            group = Group.objects.create(
+                title='Группа', slug='bench-api', description='Для замера')
+            Follow.objects.create(user=reader, author=author)
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            make_posts(options['posts'], options['batch_size'],
+                       author=author, group=group)
+            feed.rebuild([author.pk])
+            client = Client()
+            client.force_login(reader)
+            endpoints = (
+                ('лента', 'posts:index', 'api:index', []),
+                ('группа', 'posts:group_list', 'api:group_posts',
+                 [group.slug]),
+                ('профиль', 'posts:profile', 'api:profile',
+                 [author.username]),
+                ('подписки', 'posts:follow_index', 'api:follow_index', []),
+            )
+            self.stdout.write(
+                f'{"":>10} {"HTML, мс":>10} {"из кэша":>9} '
+                f'{"API, мс":>9} {"из кэша":>9} {"HTML, КБ":>9} '
+                f'{"API, КБ":>8}')
+            for title, page, api, args in endpoints:
+                html = measure(
+                    client, reverse(page, args=args), options['repeat'])
+                json = measure(
+                    client, reverse(api, args=args), options['repeat'])
+                self.stdout.write(
+                    f'{title:>10} {html[0]:>10.2f} {html[1]:>9.2f} '
+                    f'{json[0]:>9.2f} {json[1]:>9.2f} {html[2]:>9.1f} '
+                    f'{json[2]:>8.1f}')
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.utils import CursorPaginator
+from yatube.settings import NUMBER_POST
+from ._bench import make_posts, rollback, timeit
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает OFFSET/COUNT и курсорную пагинацию ленты '
+            'на глубоких страницах. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--pages', type=int, nargs='+',
+            default=[1, 10, 100, 1000, 10000, 50000, 99000],
+        )
+
+    def handle(self, *args, **options):
+        with rollback():
+            author = User.objects.create_user(username='bench_pagination')
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            make_posts(options['posts'], options['batch_size'], author=author)
+            posts = Post.objects.select_related('author', 'group')
+            ordered = posts.order_by('-pub_date', '-pk')
+            self.stdout.write(f'{"страница":>10} {"offset, мс":>12} '
+                              f'{"курсор, мс":>12}')
+            for number in options['pages']:
+                offset = (number - 1) * NUMBER_POST
+                if offset >= options['posts']:
+                    continue
+                cursor_paginator = CursorPaginator(posts, NUMBER_POST)
+                token = None
+                if number > 1:
+                    token = cursor_paginator.encode_cursor(
+                        ordered[offset - 1], number - 1)
+
+                def by_offset():
+                    paginator = Paginator(posts, NUMBER_POST)
+                    list(paginator.page(number))
+
+                def by_cursor():
+                    list(cursor_paginator.cursor_page(after=token))
+
+                self.stdout.write(
+                    f'{number:>10} '
+                    f'{timeit(by_offset, options["repeat"]):>12.2f} '
+                    f'{timeit(by_cursor, options["repeat"]):>12.2f}'
+                )
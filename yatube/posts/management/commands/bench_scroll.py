@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from posts import feed
+from posts.models import Follow, Group
+from ._bench import make_posts, measure, rollback
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает следующую страницу ленты целиком и фрагмент с '
+            'карточками для прокрутки. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rollback():
+            author = User.objects.create_user(username='bench_scroll')
+            reader = User.objects.create_user(username='bench_scroll_reader')
+            group = Group.objects.create(
+                title='Группа', slug='bench-scroll', description='Для замера')
+            Follow.objects.create(user=reader, author=author)
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            make_posts(options['posts'], options['batch_size'],
+                       author=author, group=group)
+            feed.rebuild([author.pk])
+            client = Client()
+            client.force_login(reader)
+            endpoints = (
+                ('лента', reverse('posts:index')),
+                ('группа', reverse('posts:group_list', args=[group.slug])),
+                ('профиль', reverse('posts:profile', args=[author.username])),
+                ('подписки', reverse('posts:follow_index')),
+            )
+            self.stdout.write(
+                f'{"":>10} {"страница, мс":>13} {"КБ":>6} '
+                f'{"фрагмент, мс":>13} {"КБ":>6}')
+            for title, url in endpoints:
+                cursor = client.get(url, {'fragment': 'cards'})[
+                    'X-Next-Cursor']
+                page = measure(client, url, options['repeat'], after=cursor)
+                cards = measure(client, url, options['repeat'],
+                                after=cursor, fragment='cards')
+                self.stdout.write(
+                    f'{title:>10} {page[0]:>13.2f} {page[2]:>6.1f} '
+                    f'{cards[0]:>13.2f} {cards[2]:>6.1f}')
@@ -0,0 +1,72 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import SearchResults
+from ._bench import rollback, timeit
+
+User = get_user_model()
+
+SYLLABLES = ('ка', 'ло', 'ми', 'ра', 'ту', 'не', 'за', 'ве', 'до', 'шо')
+
+
+def vocabulary(size, seed=0):
+    """Слова из слогов: size разных слов, как в живом тексте."""
+    generator = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(generator.choices(SYLLABLES, k=4)))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск LIKE по тексту постов и индекс FTS5: первая '
+            'страница и число найденных. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--words', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        words = vocabulary(5000)
+        generator = random.Random(1)
+        # Частота слов по Ципфу: первое встречается часто, последнее редко.
+        weights = [1 / rank for rank in range(1, len(words) + 1)]
+        with rollback():
+            author = User.objects.create_user(username='bench_search')
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            created = 0
+            while created < options['posts']:
+                size = min(options['batch_size'],
+                           options['posts'] - created)
+                Post.objects.bulk_create(
+                    Post(text=' '.join(generator.choices(
+                        words, weights, k=options['words'])), author=author)
+                    for _ in range(size))
+                created += size
+            self.stdout.write(
+                f'{"слово":>18} {"найдено":>9} {"LIKE, мс":>10} '
+                f'{"FTS5, мс":>10}')
+            for word in (words[0], words[50], words[-1]):
+                self.compare(word, options['repeat'])
+
+    def compare(self, word, repeat):
+        def like():
+            found = Post.objects.filter(text__icontains=word)
+            list(found.order_by('-pub_date')[:10])
+            return found.count()
+
+        def fts():
+            results = SearchResults(word)
+            results[0:10]
+            return results.count()
+
+        count = fts()
+        like_time = timeit(like, repeat)
+        fts_time = timeit(fts, repeat)
+        self.stdout.write(
+            f'{word:>18} {count:>9} {like_time:>10.1f} {fts_time:>10.1f}')
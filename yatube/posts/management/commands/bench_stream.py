@@ -0,0 +1,95 @@
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Group
+from ._bench import make_posts, rollback
+
+User = get_user_model()
+
+
+def first_byte(client, url):
+    """(до первого куска мс, весь ответ мс) для GET url без кэша."""
+    cache.clear()
+    start = time.perf_counter()
+    response = client.get(url)
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        first = time.perf_counter()
+        for _ in chunks:
+            pass
+    else:
+        response.content
+        first = time.perf_counter()
+    end = time.perf_counter()
+    return (first - start) * 1000, (end - start) * 1000
+
+
+def peak_memory(client, url):
+    """Пик памяти Python в КБ за GET url без кэша."""
+    cache.clear()
+    tracemalloc.start()
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    else:
+        response.content
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает render() и потоковую отдачу страниц лент: время до '
+            'первого байта, до конца ответа и пик памяти. Данные '
+            'откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--per-page', type=int, default=200,
+                            help='постов на странице, как NUMBER_POST')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rollback():
+            author = User.objects.create_user(username='bench_stream')
+            group = Group.objects.create(
+                title='Группа', slug='bench-stream', description='Для замера')
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            make_posts(options['posts'], options['batch_size'],
+                       author=author, group=group)
+            client = Client()
+            endpoints = (
+                ('лента', reverse('posts:index')),
+                ('группа', reverse('posts:group_list', args=[group.slug])),
+                ('профиль', reverse('posts:profile', args=[author.username])),
+            )
+            self.stdout.write(
+                f'{"":>8} {"режим":>8} {"первый байт, мс":>16} '
+                f'{"весь ответ, мс":>15} {"пик, КБ":>8}')
+            for title, url in endpoints:
+                for mode in (False, True):
+                    with override_settings(STREAMING_PAGES=mode,
+                                           NUMBER_POST=options['per_page']):
+                        self.report(client, title, url, mode, options)
+
+    def report(self, client, title, url, streaming, options):
+        first_byte(client, url)
+        timings = [first_byte(client, url)
+                   for _ in range(options['repeat'])]
+        first = statistics.median(timing[0] for timing in timings)
+        total = statistics.median(timing[1] for timing in timings)
+        peak = peak_memory(client, url)
+        mode = 'поток' if streaming else 'render'
+        self.stdout.write(
+            f'{title:>8} {mode:>8} {first:>16.1f} {total:>15.1f} '
+            f'{peak:>8.0f}')
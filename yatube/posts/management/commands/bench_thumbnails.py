@@ -0,0 +1,84 @@
+import io
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from posts.thumbnails import SHAPES, backend, render, variants
+from ._bench import rollback, timeit
+
+
+def make_image(size):
+    """JPEG с шумом: сжимается так же плохо, как фотография."""
+    image = Image.effect_noise(size, 64).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пропускную способность фоновой подготовки миниатюр '
+            'и цену миниатюры в запросе до и после неё.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=100)
+        parser.add_argument('--width', type=int, default=3000)
+        parser.add_argument('--height', type=int, default=2000)
+        parser.add_argument('--workers', type=int, nargs='+',
+                            default=[1, 2, 4])
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media), rollback():
+                self.run(options)
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+
+    def upload(self, prefix, content, count):
+        return [
+            default_storage.save(f'posts/{prefix}_{i}.jpg',
+                                 ContentFile(content))
+            for i in range(count)
+        ]
+
+    def run(self, options):
+        content = make_image((options['width'], options['height']))
+        count = options['images']
+        sources = []
+        self.stdout.write(f'{"потоков":>8} {"картинок/с":>12} '
+                          f'{"миниатюр/с":>12}')
+        for workers in options['workers']:
+            names = self.upload(f'w{workers}', content, count)
+            sources += names
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(render, names))
+            elapsed = time.perf_counter() - start
+            per_image = sum(
+                len(list(variants(shape, options['width'])))
+                for shape in SHAPES)
+            self.stdout.write(
+                f'{workers:>8} {count / elapsed:>12.1f} '
+                f'{count * per_image / elapsed:>12.1f}')
+
+        cold = iter(self.upload('cold', content, 5))
+        sources += [f'posts/cold_{i}.jpg' for i in range(5)]
+        _, _, geometry, thumbnail_options = list(variants('card'))[-1]
+        on_demand = timeit(
+            lambda: get_thumbnail(next(cold), geometry, **thumbnail_options))
+        ready = timeit(lambda: backend.ready(sources[0], 'card'), 100)
+        self.stdout.write(
+            f'Миниатюра в запросе: {on_demand:.1f} мс при первом чтении, '
+            f'{ready:.2f} мс для готовой.')
+        for name in sources:
+            default.kvstore.delete_thumbnails(ImageFile(name))
+            default.kvstore.delete(ImageFile(name))
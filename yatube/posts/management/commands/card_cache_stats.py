@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import card_stats, reset_card_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает долю попаданий в кэш карточек постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        hits, misses = card_stats()
+        total = hits + misses
+        ratio = hits / total if total else 0
+        self.stdout.write(
+            f'Попаданий: {hits}, промахов: {misses}, доля: {ratio:.1%}')
+        if options['reset']:
+            reset_card_stats()
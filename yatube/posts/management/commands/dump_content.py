@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts.dump import CHECKPOINT, dump, peak_rss
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и '
+            'подписки в сжатый NDJSON по модели. Прерванная выгрузка '
+            'продолжается с checkpoint.json.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, забыв checkpoint.')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        checkpoint = os.path.join(directory, CHECKPOINT)
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        dump(directory, options['chunk_size'], report=self.report)
+
+    def report(self, model, count, elapsed):
+        self.stdout.write(
+            f'{model._meta.label_lower}: {count} строк за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с), '
+            f'пик памяти {peak_rss():.0f} МБ')
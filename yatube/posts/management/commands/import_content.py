@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts.importing import (
+    IMPORTERS, Lookup, create_users, import_rows, open_input, read_rows,
+    rebuild)
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из NDJSON или CSV '
+            'пачками, затем один раз пересчитывает счётчики, ленты и кэш.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="Файл или '-' для stdin.")
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных авторов без пароля.')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать в конце: несколько загрузок подряд.')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        format_ = options['format'] or (
+            'csv' if os.path.splitext(path)[1].lower() == '.csv'
+            else 'ndjson')
+        users = Lookup(
+            User, 'username',
+            create_users if options['create_users'] else None)
+        self.start = self.last = time.perf_counter()
+        self.imported = 0
+        authors = set()
+        finished = False
+        try:
+            with open_input(path) as stream:
+                imported, skipped, _ = import_rows(
+                    options['kind'], read_rows(stream, format_),
+                    options['batch_size'], users,
+                    on_batch=self.progress, on_error=self.error,
+                    authors=authors)
+            finished = True
+        except (OSError, ValueError, IntegrityError) as error:
+            # Например, строку с тем же id записал кто-то другой.
+            raise CommandError(error)
+        else:
+            elapsed = time.perf_counter() - self.start
+            self.stdout.write(
+                f'Загружено {imported}, пропущено {skipped} за '
+                f'{elapsed:.1f} с ({imported / max(elapsed, 1e-9):.0f} '
+                f'строк/с)')
+        finally:
+            # Записанные до ошибки пачки остаются в базе: их счётчики,
+            # ленты и кэш тоже нужно пересчитать.
+            if not options['no_rebuild'] and (finished or self.imported):
+                self.rebuild(authors)
+
+    def rebuild(self, authors):
+        start = time.perf_counter()
+        rebuild(authors)
+        self.stdout.write(
+            f'Счётчики, ленты и кэш пересчитаны за '
+            f'{time.perf_counter() - start:.1f} с')
+
+    def progress(self, imported, skipped):
+        self.imported = imported
+        now = time.perf_counter()
+        if now - self.last < 5:
+            return
+        self.last = now
+        rate = imported / (now - self.start)
+        self.stderr.write(f'{imported} строк, {rate:.0f} строк/с')
+
+    def error(self, number, error):
+        if self.verbosity > 1:
+            self.stderr.write(f'Строка {number} пропущена: {error}')
@@ -0,0 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import work
+
+
+class Command(BaseCommand):
+    help = ('Готовит недостающие варианты картинок для уже опубликованных '
+            'постов, например после смены SHAPES или WIDTHS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image='')
+            .values_list('pk', flat=True).iterator()
+        )
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            done = sum(1 for _ in pool.map(work, posts))
+        self.stdout.write(f'Обработано постов: {done}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile(chunk_size=options['chunk_size'])
+        self.stdout.write(f'Исправлено строк: {fixed}')
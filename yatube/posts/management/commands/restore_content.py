@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.dump import RestoreConflict, peak_rss, restore
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку dump_content пачками в порядке '
+            'зависимостей и пересчитывает счётчики, ленты и кэш.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            restore(options['directory'], options['batch_size'],
+                    report=self.report)
+        except RestoreConflict as error:
+            raise CommandError(
+                f'{error}. Загружайте выгрузку в пустую базу.')
+
+    def report(self, model, count, elapsed):
+        if model is None:
+            self.stdout.write(
+                f'Счётчики, ленты и кэш пересчитаны за {elapsed:.1f} с, '
+                f'пик памяти {peak_rss():.0f} МБ')
+            return
+        self.stdout.write(
+            f'{model._meta.label_lower}: {count} строк за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с), '
+            f'пик памяти {peak_rss():.0f} МБ')
@@ -0,0 +1,116 @@
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.http import StreamingHttpResponse
+from django.test import override_settings
+
+from core.events import get_hub, publish, stream
+
+
+def rss():
+    """Текущая память процесса в мегабайтах (VmRSS из /proc)."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+class Command(BaseCommand):
+    help = ('Держит тысячи простаивающих потоков SSE и измеряет память на '
+            'соединение и время рассылки одного события всем. События '
+            'пишутся во временный журнал.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000)
+        parser.add_argument('--topics', type=int, default=100)
+        parser.add_argument(
+            '--threads', action='store_true',
+            help='по потоку на соединение, как у синхронного WSGI-сервера')
+        parser.add_argument('--hold', type=float, default=5,
+                            help='сколько секунд держать соединения')
+        parser.add_argument('--heartbeat', type=float, default=1)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                    EVENTS_PATH=os.path.join(directory, 'events.sqlite3'),
+                    EVENTS_HEARTBEAT=options['heartbeat'],
+                    EVENTS_STREAM_TIME=60 * 60):
+                self.soak(options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def soak(self, options):
+        hub = get_hub()
+        # Поток чтения журнала запускается первой подпиской.
+        hub.unsubscribe(hub.subscribe(['warmup']))
+        count = options['subscribers']
+        gc.collect()
+        tracemalloc.start()
+        heap_before, rss_before = tracemalloc.get_traced_memory()[0], rss()
+        counts = Counter()
+        lock = threading.Lock()
+        connections = []
+        start = time.perf_counter()
+        for number in range(count):
+            topics = ['global', f'group:{number % options["topics"]}']
+            response = StreamingHttpResponse(
+                stream(topics), content_type='text/event-stream')
+            chunks = iter(response.streaming_content)
+            thread = None
+            if options['threads']:
+                thread = threading.Thread(
+                    target=self.consume, args=(chunks, counts, lock),
+                    daemon=True)
+                thread.start()
+            else:
+                next(chunks)
+            connections.append((response, chunks, thread))
+        while hub.subscribers() < count:
+            time.sleep(0.01)
+        connect_time = time.perf_counter() - start
+        gc.collect()
+        heap = tracemalloc.get_traced_memory()[0] - heap_before
+        memory = rss() - rss_before
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{count} соединений за {connect_time:.1f} с; на соединение: '
+            f'{heap / count / 1024:.1f} КБ Python, '
+            f'{memory * 1024 / count:.1f} КБ RSS')
+        time.sleep(options['hold'])
+
+        start = time.perf_counter()
+        publish([('global', 'post', {'id': 0})])
+        if options['threads']:
+            while counts['events'] < count:
+                time.sleep(0.001)
+        else:
+            for _, chunks, _ in connections:
+                assert next(chunks).startswith(b'id:')
+        fan_out = time.perf_counter() - start
+        self.stdout.write(
+            f'Событие дошло до всех за {fan_out * 1000:.0f} мс; '
+            f'сердцебиений за {options["hold"]:.0f} с: {counts["pings"]}')
+        hub.close_all()
+        for response, _, thread in connections:
+            if thread is not None:
+                thread.join()
+            # Как сервер по окончании ответа: закрывает поток и подписку.
+            response.close()
+
+    def consume(self, chunks, counts, lock):
+        for chunk in chunks:
+            with lock:
+                if chunk.startswith(b'id:'):
+                    counts['events'] += 1
+                elif chunk.startswith(b': ping'):
+                    counts['pings'] += 1
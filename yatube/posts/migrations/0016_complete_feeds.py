@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def complete_feeds(apps, schema_editor):
+    """Дописывает посты, которые не попали в ленты из-за старого предела.
+
+    Раньше при подписке в ленту клались только последние посты автора.
+    Авторы, которые не рассылаются по лентам, пропускаются.
+    """
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    pull = AuthorStats.objects.filter(
+        following_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True)
+    for follow in Follow.objects.exclude(author_id__in=pull).iterator():
+        posts = Post.objects.filter(
+            author_id=follow.author_id).values_list('pk', 'pub_date')
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=follow.user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts.iterator()),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(complete_feeds, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -42,12 +43,30 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
     )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:self.TEXTMAX]
@@ -79,6 +98,9 @@ class Comment(models.Model):
         ordering = ['created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'], name='comment_post_idx'),
+        ]
 
     def __str__(self):
         return self.text[:self.COMMENTMAX]
@@ -105,3 +127,60 @@ class Follow(models.Model):
                 name='unique_follows'
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'], name='follow_author_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые обновляются вместе с данными.
+
+    follower_count и following_count совпадают с user.follower.count()
+    и user.following.count(): подписки пользователя и его подписчики.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    follower_count = models.PositiveIntegerField('Подписок', default=0)
+    following_count = models.PositiveIntegerField('Подписчиков', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_user_idx'
+            ),
+        ]
@@ -0,0 +1,38 @@
+"""События о новых постах и комментариях для потоков SSE.
+
+Темы совпадают с областями кэша страниц: global, group:<slug>,
+author:<username> и post:<id> для комментариев поста. Лента подписок
+слушает темы авторов, на которых подписан читатель. Без EVENTS_ENABLED
+события не пишутся.
+"""
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from core.events import publish
+
+
+def post_created(post, scopes):
+    """Новый пост в каждую ленту, где он виден."""
+    if not settings.EVENTS_ENABLED:
+        return
+    data = {
+        'id': post.pk,
+        'author': post.author.username,
+        'pub_date': post.pub_date,
+    }
+    publish([(scope, 'post', data) for scope in scopes
+             if scope != f'post:{post.pk}'])
+
+
+def comment_created(comment):
+    """Новый комментарий с готовым HTML для страницы поста."""
+    if not settings.EVENTS_ENABLED:
+        return
+    publish([(f'post:{comment.post_id}', 'comment', {
+        'id': comment.pk,
+        'post': comment.post_id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'html': render_to_string(
+            'includes/comment.html', {'comment': comment}),
+    })])
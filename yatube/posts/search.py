@@ -0,0 +1,114 @@
+"""Полнотекстовый поиск по постам через индекс FTS5 posts_post_search.
+
+Индекс создаётся миграцией 0015 и обновляется триггерами базы, поэтому
+в него попадают и посты из bulk_create. В базах без FTS5 поиск
+откатывается на LIKE, как раньше в админке.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+# Слова короче не ищутся по префиксу: слишком много совпадений.
+PREFIX_MIN_LENGTH = 3
+SNIPPET_TOKENS = 24
+# Границы совпадений в snippet(): символы, которых нет в тексте постов.
+MARK_START, MARK_END = '\x02', '\x03'
+
+WORD = re.compile(r'\w+')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """Запрос FTS5 из пользовательского ввода: все слова, по префиксу.
+
+    Операторы FTS5 из ввода не проходят: каждое слово берётся в кавычки.
+    Пустая строка — искать нечего.
+    """
+    terms = []
+    for word in WORD.findall(query.lower()):
+        term = f'"{word}"'
+        if len(word) >= PREFIX_MIN_LENGTH:
+            term += '*'
+        terms.append(term)
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Фрагмент с <mark> вокруг совпадений; остальное экранируется."""
+    html = escape(snippet)
+    html = html.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def matching(queryset, query):
+    """Посты queryset, в тексте которых есть все слова query."""
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if not available():
+        for word in WORD.findall(query):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [match]))
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности (bm25).
+
+    Paginator берёт count() и срез: в базу уходит COUNT по индексу и
+    запрос одной страницы с фрагментами, посты страницы — одним запросом.
+    """
+
+    def __init__(self, query):
+        self.match = match_query(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        if not available():
+            return self.fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.match])
+            return cursor.fetchone()[0]
+
+    def fallback(self):
+        return matching(Post.objects.all(), self.match).order_by('-pub_date')
+
+    def __getitem__(self, page):
+        if not self.match:
+            return []
+        offset, limit = page.start or 0, page.stop - (page.start or 0)
+        if not available():
+            posts = list(
+                self.fallback().select_related('author', 'group')[page])
+            for post in posts:
+                post.snippet = post.text
+            return posts
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({TABLE}, 0, %s, %s, '…', %s) "
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, SNIPPET_TOKENS, self.match,
+                 limit, offset])
+            found = cursor.fetchall()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in found])
+        result = []
+        for pk, snippet in found:
+            if pk in posts:
+                posts[pk].snippet = highlight(snippet)
+                result.append(posts[pk])
+        return result
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed, push
+from .cache import bump_card, bump_pages, post_scopes
+from .images import release, settle
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .utils import forget_counts
+
+
+# Поля пользователя, которые выводятся в карточке поста.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+    elif update_fields is None or CARD_USER_FIELDS & set(update_fields):
+        bump_card('author', instance.pk)
+        slugs = (
+            Group.objects.filter(posts__author=instance)
+            .values_list('slug', flat=True).distinct()
+        )
+        bump_pages('global', f'author:{instance.username}',
+                   *(f'group:{slug}' for slug in slugs))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_card('group', instance.pk)
+        bump_pages('global', f'group:{instance.slug}')
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    instance._old_group_id = instance._old_image = None
+    if instance.pk:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    # SQLite может выдать новому посту id только что удалённого.
+    bump_card('post', instance.pk)
+    if instance.image:
+        image = instance.image.name
+        transaction.on_commit(lambda: settle(image))
+    if created:
+        counters.bump(instance.author_id, posts_count=1)
+        feed.fan_out(instance)
+        forget_counts(instance)
+        scopes = post_scopes(instance)
+        bump_pages(*scopes)
+        transaction.on_commit(lambda: push.post_created(instance, scopes))
+    else:
+        if instance._old_group_id != instance.group_id:
+            forget_counts(instance, instance._old_group_id)
+        bump_pages(*post_scopes(instance, instance._old_group_id))
+        if instance._old_image != instance.image.name:
+            old_image = instance._old_image
+            transaction.on_commit(lambda: release(old_image))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts_count=-1)
+    forget_counts(instance)
+    feed.forget(instance)
+    bump_pages(*post_scopes(instance))
+    transaction.on_commit(lambda: release(instance.image.name))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(instance.author_id, comments_count=1)
+        counters.bump_comments(instance.post_id, 1)
+        bump_pages(f'post:{instance.post_id}',
+                   f'author:{instance.author.username}')
+        transaction.on_commit(lambda: push.comment_created(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, comments_count=-1)
+    counters.bump_comments(instance.post_id, -1)
+    bump_pages(f'post:{instance.post_id}',
+               f'author:{instance.author.username}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(instance.user_id, follower_count=1)
+        counters.bump(instance.author_id, following_count=1)
+        feed.backfill(instance)
+        bump_pages(f'author:{instance.user.username}',
+                   f'author:{instance.author.username}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump(instance.user_id, follower_count=-1)
+    counters.bump(instance.author_id, following_count=-1)
+    feed.prune(instance)
+    bump_pages(f'author:{instance.user.username}',
+               f'author:{instance.author.username}')
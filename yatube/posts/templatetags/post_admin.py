@@ -0,0 +1,120 @@
+"""date_hierarchy для больших таблиц.
+
+Стандартный тег считает MIN и MAX одним запросом и выбирает даты через
+DISTINCT по всей выборке, то есть читает каждую строку. Здесь крайние
+даты и каждая следующая дата ищутся отдельным запросом с LIMIT 1 по
+индексу поля: запросов столько, сколько пунктов в списке.
+"""
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.db.models.sql.where import AND
+from django.utils import timezone
+
+register = template.Library()
+
+
+def truncate(value, kind):
+    """Начало года, месяца или дня, в которое попадает value."""
+    value = timezone.localtime(value).date()
+    if kind == 'year':
+        return value.replace(month=1, day=1)
+    if kind == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def following(date, kind):
+    """Начало следующего года, месяца или дня."""
+    if kind == 'year':
+        return date.replace(year=date.year + 1)
+    if kind == 'month':
+        if date.month == 12:
+            return date.replace(year=date.year + 1, month=1)
+        return date.replace(month=date.month + 1)
+    return date + datetime.timedelta(days=1)
+
+
+def moment(date):
+    return timezone.make_aware(
+        datetime.datetime.combine(date, datetime.time()))
+
+
+def pop_bounds(queryset, field):
+    """queryset без условий field >= и field < и самые узкие их значения.
+
+    Год и месяц из date_hierarchy и фильтр по дате превращаются в такие
+    условия. Если к ним добавить границу шага, у SQLite будет две нижние
+    границы, и индекс он начнёт читать с первой из них.
+    """
+    queryset = queryset.all()
+    model_field = queryset.model._meta.get_field(field)
+    bounds = {'gte': [], 'lt': []}
+    where = queryset.query.where
+    if where.connector != AND or where.negated:
+        return queryset, None, None
+    kept = []
+    for child in where.children:
+        target = getattr(getattr(child, 'lhs', None), 'target', None)
+        name = getattr(child, 'lookup_name', None)
+        if target is model_field and name in bounds:
+            value = model_field.to_python(child.rhs)
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            bounds[name].append(value)
+        else:
+            kept.append(child)
+    where.children = kept
+    return (queryset, max(bounds['gte'], default=None),
+            min(bounds['lt'], default=None))
+
+
+class IndexedDates:
+    """То немногое из QuerySet, что нужно тегу date_hierarchy."""
+
+    def __init__(self, queryset, field):
+        self.field = field
+        queryset, self.start, self.end = pop_bounds(queryset, field)
+        self.queryset = (
+            queryset.order_by().filter(**{f'{field}__isnull': False})
+            .values_list(field, flat=True)
+        )
+
+    def edge(self, order, after=None):
+        lower = max(filter(None, (self.start, after)), default=None)
+        queryset = self.queryset
+        if lower is not None:
+            queryset = queryset.filter(**{f'{self.field}__gte': lower})
+        if self.end is not None:
+            queryset = queryset.filter(**{f'{self.field}__lt': self.end})
+        return queryset.order_by(order).first()
+
+    def aggregate(self, **kwargs):
+        return {'first': self.edge(self.field),
+                'last': self.edge(f'-{self.field}')}
+
+    def dates(self, field, kind):
+        found = []
+        value = self.edge(field)
+        while value is not None:
+            date = truncate(value, kind)
+            found.append(date)
+            value = self.edge(field, moment(following(date, kind)))
+        return found
+
+
+class IndexedChangeList:
+    """ChangeList, у которого queryset отвечает тегу через индекс."""
+
+    def __init__(self, cl):
+        self.cl = cl
+        self.queryset = IndexedDates(cl.queryset, cl.date_hierarchy)
+
+    def __getattr__(self, name):
+        return getattr(self.cl, name)
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def indexed_date_hierarchy(cl):
+    return date_hierarchy(IndexedChangeList(cl))
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.thumbnails import backend
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_picture(image, shape, sizes=None):
+    """Готовые варианты картинки для места shape; None, пока их нет."""
+    return backend.ready(image, shape, sizes)
@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+from yatube.settings import NUMBER_POST
+
+
+def run_now(func):
+    """Замена transaction.on_commit: в TestCase коммита не бывает."""
+    func()
+
+
+class FeedPagesTestCase(TestCase):
+    """Автор с постами на полторы страницы и подписанный на него читатель.
+
+    urls — четыре ленты: главная, группа, профиль и подписки; клиент
+    входит как читатель.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(NUMBER_POST + 3):
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author.username]),
+            reverse('posts:follow_index'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
@@ -0,0 +1,74 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+
+CHANGELIST_URL = reverse('admin:posts_post_changelist')
+
+
+def moment(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        posts = Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.admin, group=cls.group)
+            for i in range(4))
+        dates = (moment(2021, 3, 5), moment(2021, 7, 1),
+                 moment(2021, 7, 9), moment(2022, 1, 1))
+        for post, date in zip(posts, dates):
+            Post.objects.filter(text=post.text).update(pub_date=date)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(CHANGELIST_URL)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк."""
+        few = self.queries()
+        Post.objects.bulk_create(
+            Post(text='Ещё', author=self.admin, group=self.group)
+            for _ in range(10))
+        # Те же годы: число пунктов date_hierarchy не меняется.
+        Post.objects.filter(text='Ещё').update(pub_date=moment(2021, 3, 5))
+        self.assertEqual(self.queries(), few)
+
+    def test_date_hierarchy(self):
+        """Годы, месяцы и дни с постами находятся прыжками по индексу."""
+        levels = (
+            ({}, ['pub_date__year=2021', 'pub_date__year=2022'], []),
+            ({'pub_date__year': 2021},
+             ['pub_date__month=3', 'pub_date__month=7'],
+             ['pub_date__month=1']),
+            ({'pub_date__year': 2021, 'pub_date__month': 7},
+             ['pub_date__day=1', 'pub_date__day=9'],
+             ['pub_date__day=5']),
+        )
+        for params, present, absent in levels:
+            with self.subTest(params=params):
+                response = self.client.get(CHANGELIST_URL, params)
+                for link in present:
+                    self.assertContains(response, link)
+                for link in absent:
+                    self.assertNotContains(response, link)
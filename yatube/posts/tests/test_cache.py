@@ -0,0 +1,151 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.cache import (
+    attach_cards, bump_pages, card_stats, reset_card_stats)
+from posts.models import Follow, Group, Post, User
+
+CARD_TEMPLATE = 'includes/posts_form.html'
+
+
+class CardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='cached', first_name='Иван')
+        cls.group = Group.objects.create(
+            title='Старое название', slug='cards', description='Группа')
+        cls.post = Post.objects.create(
+            text='Исходный текст', author=cls.author, group=cls.group)
+        cls.GROUP_URL = reverse('posts:group_list', args=[cls.group.slug])
+
+    def setUp(self):
+        cache.clear()
+        reset_card_stats()
+        self.client = Client()
+
+    def cards(self):
+        posts = list(Post.objects.select_related('author', 'group'))
+        attach_cards(posts, CARD_TEMPLATE)
+        return posts[0].card
+
+    def test_card_rendered_once(self):
+        """Повторная отрисовка берёт карточку из кэша."""
+        self.assertEqual(self.cards(), self.cards())
+        self.assertEqual(card_stats(), (1, 1))
+
+    def test_card_invalidation(self):
+        """Карточка перерисовывается после правки поста, группы и автора."""
+        self.cards()
+        changes = (
+            (self.post, 'text', 'Новый текст'),
+            (self.group, 'title', 'Новое название'),
+            (self.author, 'first_name', 'Пётр'),
+        )
+        for misses, (obj, field, value) in enumerate(changes, start=2):
+            with self.subTest(field=field):
+                setattr(obj, field, value)
+                obj.save()
+                card = self.cards()
+                self.assertEqual(card_stats()[1], misses)
+                if field != 'title':
+                    self.assertIn(value, card)
+
+    def test_login_keeps_cards(self):
+        """Вход автора на сайт не сбрасывает его карточки."""
+        self.cards()
+        self.client.force_login(self.author)
+        self.cards()
+        self.assertEqual(card_stats(), (1, 1))
+
+    def test_stats_flushed_in_batches(self):
+        """Страница не пишет счётчики в кэш, пока не подошёл срок."""
+        self.cards()
+        with mock.patch('posts.cache.incr') as incr:
+            self.cards()
+        incr.assert_not_called()
+        self.assertEqual(card_stats(), (1, 1))
+
+    def test_group_page_uses_cards(self):
+        """Страница группы выводит карточки из кэша."""
+        self.client.get(self.GROUP_URL)
+        self.client.force_login(self.author)
+        response = self.client.get(self.GROUP_URL)
+        self.assertContains(response, 'Исходный текст')
+        self.assertEqual(card_stats(), (1, 1))
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='pages', description='Группа')
+        cls.post = Post.objects.create(
+            text='Текст поста', author=cls.author, group=cls.group)
+        cls.GROUP_URL = reverse('posts:group_list', args=[cls.group.slug])
+        cls.PROFILE_URL = reverse('posts:profile', args=[cls.author])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_page_cached_until_bump(self):
+        """Страница отдаётся из кэша, пока не сменится поколение."""
+        self.client.get(self.GROUP_URL)
+        Post.objects.bulk_create([Post(
+            text='Без сигналов', author=self.author, group=self.group)])
+        self.assertNotContains(
+            self.client.get(self.GROUP_URL), 'Без сигналов')
+        bump_pages('group:pages')
+        self.assertContains(self.client.get(self.GROUP_URL), 'Без сигналов')
+
+    def test_unknown_params_share_page(self):
+        """Параметры, которые лента не читает, не заводят новую страницу."""
+        self.client.get(self.GROUP_URL, {'x': 1})
+        Post.objects.bulk_create([Post(
+            text='Без сигналов', author=self.author, group=self.group)])
+        self.assertNotContains(
+            self.client.get(self.GROUP_URL, {'x': 2}), 'Без сигналов')
+        self.assertContains(
+            self.client.get(self.GROUP_URL, {'page': 1}), 'Без сигналов')
+
+    @mock.patch('core.cache.WAIT_TIME', 0)
+    def test_no_old_page_while_locked(self):
+        """Пока пересчёт занят другим, старое поколение не отдаётся."""
+        self.client.get(self.GROUP_URL)
+        Post.objects.bulk_create([Post(
+            text='Без сигналов', author=self.author, group=self.group)])
+        bump_pages('group:pages')
+        with mock.patch('core.cache.cache.add', return_value=False):
+            response = self.client.get(self.GROUP_URL)
+        self.assertContains(response, 'Без сигналов')
+
+    def test_group_rename(self):
+        """Переименование группы обновляет её страницу."""
+        self.client.get(self.GROUP_URL)
+        self.group.title = 'Новое имя группы'
+        self.group.save()
+        self.assertContains(
+            self.client.get(self.GROUP_URL), 'Новое имя группы')
+
+    def test_follow_updates_profile(self):
+        """Подписка обновляет счётчики в профиле автора."""
+        self.client.get(self.PROFILE_URL)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(self.PROFILE_URL)
+        self.assertEqual(response.context['following_count'], 1)
+
+    def test_cache_per_viewer(self):
+        """Разные пользователи не получают чужую страницу."""
+        self.client.get(self.PROFILE_URL)
+        self.client.force_login(self.reader)
+        response = self.client.get(self.PROFILE_URL)
+        self.assertTrue(response.context['following'] is False)
+        self.assertContains(response, 'reader')
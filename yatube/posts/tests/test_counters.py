@@ -0,0 +1,82 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.counters import stats_for
+from posts.models import AuthorStats, Comment, Follow, Post, User
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counted')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        author, reader = self.stats(self.author), self.stats(self.reader)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.following_count, 1)
+        self.assertEqual(reader.follower_count, 1)
+        self.assertEqual(reader.comments_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        Post.objects.filter(pk=self.post.pk).delete()
+        Follow.objects.all().delete()
+        author, reader = self.stats(self.author), self.stats(self.reader)
+        self.assertEqual(author.posts_count, 0)
+        self.assertEqual(author.following_count, 0)
+        self.assertEqual(reader.follower_count, 0)
+        self.assertEqual(reader.comments_count, 0)
+
+    def test_reconcile(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comments_count=0)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_row_created_concurrently(self):
+        """Строку, созданную параллельным запросом, stats_for перечитывает."""
+        user = User.objects.get(pk=self.reader.pk)
+        AuthorStats.objects.filter(user=user).delete()
+        with self.assertRaises(AuthorStats.DoesNotExist):
+            user.stats
+        AuthorStats.objects.create(user_id=user.pk, comments_count=1)
+        with mock.patch('posts.counters.set', create=True,
+                        return_value=set()):
+            self.assertEqual(stats_for(user).comments_count, 1)
+
+    def test_pages_without_aggregates(self):
+        """Профиль и пост не считают COUNT по связанным таблицам."""
+        urls = (
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                Client().get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    Client().get(url)
+                self.assertFalse(
+                    [q['sql'] for q in queries if 'COUNT(' in q['sql']])
@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.dump import dump, read_model
+from posts.models import (
+    AuthorStats, Comment, FeedEntry, Follow, Group, Post, User)
+
+
+class DumpRestoreTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def dump(self, *args):
+        call_command('dump_content', self.directory, '--chunk-size', '2',
+                     *args, stdout=StringIO())
+
+    def test_dump_and_restore(self):
+        """Выгрузка загружается обратно вместе с датами и счётчиками."""
+        self.dump()
+        pub_date = self.post.pub_date
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        output = StringIO()
+        call_command('restore_content', self.directory, stdout=output)
+        self.assertIn('posts.post: 1 строк', output.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).following_count, 1)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        # Повторный запуск пропускает уже загруженное.
+        output = StringIO()
+        call_command('restore_content', self.directory, stdout=output)
+        self.assertIn('posts.post: 0 строк', output.getvalue())
+
+    def test_restore_into_used_database(self):
+        """Чужие пользователи с теми же id или именами не подменяются."""
+        self.dump()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        others = (
+            {'username': 'other', 'id': self.author.pk},
+            {'username': 'writer', 'id': self.author.pk + 100},
+        )
+        for fields in others:
+            with self.subTest(**fields):
+                user = User.objects.create_user(**fields)
+                with self.assertRaises(CommandError):
+                    call_command('restore_content', self.directory,
+                                 stdout=StringIO())
+                self.assertFalse(Post.objects.filter(author=user).exists())
+                User.objects.all().delete()
+
+    def test_resume(self):
+        """Повторный запуск дописывает только новые строки."""
+        self.dump()
+        for i in range(3):
+            Post.objects.create(text=f'Новый пост {i}', author=self.author)
+        self.dump()
+        texts = [row['text'] for row in read_model(Post, self.directory)]
+        self.assertEqual(len(texts), 4)
+        self.assertEqual(len(set(texts)), 4)
+        self.dump('--restart')
+        self.assertEqual(len(list(read_model(Post, self.directory))), 4)
+
+    def test_rows_created_during_dump(self):
+        """Строки, созданные во время выгрузки, достаются следующей."""
+        def report(model, count, elapsed):
+            if model is Post:
+                post = Post.objects.create(text='Поздний', author=self.author)
+                Comment.objects.create(
+                    post=post, author=self.reader, text='Поздний')
+
+        dump(self.directory, report=report)
+        late = [row for row in read_model(Comment, self.directory)
+                if row['text'] == 'Поздний']
+        self.assertEqual(late, [])
+        self.dump()
+        for model in (Post, Comment):
+            texts = [row['text'] for row in read_model(model, self.directory)]
+            self.assertIn('Поздний', texts)
@@ -1,11 +1,15 @@
+import io
 import tempfile
 import shutil
 
+from PIL import Image
+
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 
+from posts.forms import PostForm
 from posts.models import Group, Post, User
 
 
@@ -114,4 +118,57 @@ class PostFormTest(TestCase):
         self.assertEqual(refresh_post.group.id, form_data["group"])
         self.assertEqual(refresh_post.author, self.post.author)
         self.assertEqual(self.post_count, Post.objects.count())
-        self.assertEqual(refresh_post.image, 'posts/small1.gif')
+        self.assertEqual(
+            refresh_post.image,
+            refresh_post.image.storage.hashed_name(
+                'posts/small1.gif', SimpleUploadedFile('', small_gif1)))
+
+
+def jpeg_upload(size, orientation=None):
+    """JPEG размера size; orientation записывается в EXIF."""
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(IMAGE_MAX_SIZE=500)
+class ImageUploadTest(TestCase):
+    def clean(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        valid = form.is_valid()
+        return form, (valid and form.cleaned_data['image'])
+
+    def test_downscale(self):
+        """Большая картинка уменьшается и поворачивается по EXIF."""
+        _, upload = self.clean(jpeg_upload((1200, 600), orientation=6))
+        image = Image.open(upload)
+        self.assertEqual(image.size, (250, 500))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(upload.name, 'photo.jpg')
+        self.assertFalse(image.getexif())
+
+    def test_strip_exif(self):
+        """Из небольшой картинки удаляются только метаданные."""
+        _, upload = self.clean(jpeg_upload((100, 50)))
+        image = Image.open(upload)
+        self.assertEqual(image.size, (100, 50))
+        self.assertFalse(image.getexif())
+
+    def test_small_image_untouched(self):
+        """Картинка без EXIF в пределах размера сохраняется как есть."""
+        upload = SimpleUploadedFile(
+            'small.gif', small_gif, content_type='image/gif')
+        _, cleaned = self.clean(upload)
+        self.assertIs(cleaned, upload)
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_reject_bomb(self):
+        """Картинка с лишними пикселями отклоняется до декодирования."""
+        form, _ = self.clean(jpeg_upload((20, 20)))
+        self.assertIn('image', form.errors)
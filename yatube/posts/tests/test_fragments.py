@@ -0,0 +1,29 @@
+from posts.tests.base import FeedPagesTestCase
+
+
+class CardsFragmentTest(FeedPagesTestCase):
+    def test_cards_only(self):
+        """Фрагмент — только карточки следующей страницы и курсор за ней."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                page = self.client.get(url).context['page_obj']
+                response = self.client.get(
+                    url, {'after': page.next_cursor, 'fragment': 'cards'})
+                templates = [template.name for template in response.templates]
+                self.assertIn('posts/cards.html', templates)
+                self.assertNotIn('base.html', templates)
+                self.assertEqual(response['X-Next-Cursor'], '')
+                self.assertEqual(
+                    response.content.decode().count('<article'), 3)
+                response = self.client.get(url, {'fragment': 'cards'})
+                self.assertEqual(
+                    response['X-Next-Cursor'], page.next_cursor)
+
+    def test_cached_fragment_keeps_cursor(self):
+        """Курсор в заголовке сохраняется вместе с кэшированной страницей."""
+        url = self.urls[0]
+        first = self.client.get(url, {'fragment': 'cards'})
+        second = self.client.get(url, {'fragment': 'cards'})
+        self.assertIsNone(second.context)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['X-Next-Cursor'], first['X-Next-Cursor'])
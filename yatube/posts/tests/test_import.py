@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.models import (
+    AuthorStats, Comment, FeedEntry, Follow, Group, Post, User)
+
+
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file_:
+            file_.write(content)
+        return path
+
+    def load(self, kind, name, content, *args):
+        out = StringIO()
+        call_command('import_content', kind, self.write(name, content),
+                     *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """Посты, комментарии и подписки загружаются и пересчитываются."""
+        posts = [
+            {'id': 100, 'author': 'writer', 'text': 'Старый пост',
+             'group': 'group', 'pub_date': '2020-01-02T03:04:05'},
+            {'author': 'writer', 'text': 'Без даты'},
+            {'author': 'nobody', 'text': 'Неизвестный автор'},
+            {'author': 'writer', 'text': 'Нет группы', 'group': 'missing'},
+        ]
+        output = self.load('posts', 'posts.ndjson',
+                           '\n'.join(json.dumps(row) for row in posts))
+        self.assertIn('Загружено 2, пропущено 2', output)
+        old = Post.objects.get(pk=100)
+        self.assertEqual(old.group, self.group)
+        self.assertEqual(old.pub_date.year, 2020)
+        self.load('comments', 'comments.ndjson', '\n'.join(
+            json.dumps({'post': post, 'author': 'reader', 'text': 'Ок'})
+            for post in (100, 100, 999)))
+        self.load('follows', 'follows.ndjson', '\n'.join(
+            json.dumps({'user': 'reader', 'author': 'writer'})
+            for _ in range(2)))
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        old.refresh_from_db()
+        self.assertEqual(old.comments_count, 2)
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.following_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_import_again(self):
+        """Повторная загрузка пропускает посты с занятыми id."""
+        content = '\n'.join(json.dumps(
+            {'id': pk, 'author': 'writer', 'text': f'Пост {pk}'})
+            for pk in (200, 201, 201))
+        self.assertIn('Загружено 2, пропущено 1',
+                      self.load('posts', 'posts.ndjson', content))
+        self.assertIn('Загружено 0, пропущено 3',
+                      self.load('posts', 'posts.ndjson', content))
+        self.assertEqual(Post.objects.filter(pk__in=(200, 201)).count(), 2)
+
+    def test_taken_ids_across_batches(self):
+        """Id, занятый в прошлой пачке, находится запросом к базе."""
+        content = '\n'.join(json.dumps(
+            {'id': pk, 'author': 'writer', 'text': f'Пост {pk}'})
+            for pk in (300, 301, 300))
+        self.assertIn(
+            'Загружено 2, пропущено 1',
+            self.load('posts', 'posts.ndjson', content, '--batch-size', '1'))
+
+    def test_bad_json_skipped(self):
+        """Неразборчивая строка пропускается, как и другие ошибки."""
+        content = '\n'.join([
+            json.dumps({'author': 'writer', 'text': 'Первый'}),
+            '{"author": "writer", "text": ',
+            '[1, 2]',
+            json.dumps({'author': 'writer', 'text': 'Второй'}),
+        ])
+        self.assertIn('Загружено 2, пропущено 2',
+                      self.load('posts', 'posts.ndjson', content))
+
+    def test_rebuild_after_abort(self):
+        """Пачки, записанные до ошибки, пересчитываются."""
+        # Вторая строка длиннее буфера чтения: первая пачка успевает
+        # записаться до неверного UTF-8.
+        lines = [json.dumps({'author': 'writer', 'text': text})
+                 for text in ('Первый', 'п' * 20000)]
+        path = os.path.join(self.directory, 'posts.ndjson')
+        with open(path, 'wb') as file_:
+            file_.write('\n'.join(lines).encode() + b'\n\xff\n')
+        with self.assertRaises(CommandError):
+            call_command('import_content', 'posts', path, '--batch-size',
+                         '1', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 1)
+
+    def test_import_csv(self):
+        """CSV читается по заголовку, новые авторы создаются по флагу."""
+        self.load('posts', 'posts.csv',
+                  'author,text,group\nnewcomer,Пост из CSV,group\n',
+                  '--create-users')
+        post = Post.objects.get(text='Пост из CSV')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(
+            AuthorStats.objects.get(user=post.author).posts_count, 1)
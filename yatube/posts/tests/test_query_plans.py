@@ -0,0 +1,76 @@
+import re
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.feed import FollowFeedPaginator
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+from posts.utils import CursorPaginator
+from yatube.settings import NUMBER_POST
+
+FULL_SCAN = re.compile(
+    r'\bSCAN (TABLE )?(posts_\w+|T\d+)$', re.MULTILINE)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    """Основные запросы лент читают индекс без полного скана и сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(title='Группа', slug='plans')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        cls.cursor = (2, timezone.now(), cls.post.pk)
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIsNone(FULL_SCAN.search(plan), plan)
+
+    def feed_queries(self, posts):
+        paginator = CursorPaginator(posts, NUMBER_POST)
+        for cursor in (None, self.cursor):
+            for newer in (False, True):
+                yield paginator.keyset(posts, cursor, newer)[:NUMBER_POST]
+
+    def test_post_feeds(self):
+        """index, group_posts и profile."""
+        feeds = {
+            'index': Post.objects.select_related('author', 'group'),
+            'group': self.group.posts.select_related('author', 'group'),
+            'profile': self.author.posts.select_related('author', 'group'),
+        }
+        for name, posts in feeds.items():
+            for queryset in self.feed_queries(posts):
+                with self.subTest(feed=name):
+                    self.assertIndexed(queryset)
+
+    def test_follow_feed(self):
+        """follow_index: записи ленты и посты авторов без рассылки."""
+        paginator = FollowFeedPaginator(None, NUMBER_POST, user=self.user)
+        for cursor in (None, self.cursor):
+            with self.subTest(cursor=cursor):
+                self.assertIndexed(paginator.keyset(
+                    FeedEntry.objects.filter(user=self.user)
+                    .select_related('post__author', 'post__group'),
+                    cursor, pk_field='post_id',
+                )[:NUMBER_POST])
+        self.assertIndexed(
+            Follow.objects.filter(author=self.author).values('user_id'))
+
+    def test_comments(self):
+        """Страницы комментариев поста по ключу (created, id)."""
+        comments = Comment.objects.filter(
+            post=self.post).select_related('author')
+        paginator = CursorPaginator(
+            comments, NUMBER_POST, date_field='created')
+        for cursor in (None, self.cursor):
+            with self.subTest(cursor=cursor):
+                self.assertIndexed(
+                    paginator.keyset(comments, cursor)[:NUMBER_POST])
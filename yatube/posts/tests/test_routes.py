@@ -17,6 +17,7 @@ class RoutesTest(TestCase):
             ["post_detail", [POST_ID], f"/posts/{POST_ID}/"],
             ["post_edit", [POST_ID], f"/posts/{POST_ID}/edit/"],
             ["add_comment", [POST_ID], f"/posts/{POST_ID}/comment/"],
+            ["post_comments", [POST_ID], f"/posts/{POST_ID}/comments/"],
             ["follow_index", [], "/follow/"],
             ["profile_follow", [USERNAME], f"/profile/{USERNAME}/follow/"],
             ["profile_unfollow", [USERNAME], f"/profile/{USERNAME}/unfollow/"],
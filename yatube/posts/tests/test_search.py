@@ -0,0 +1,70 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.search import SearchResults, match_query
+
+SEARCH_URL = reverse('posts:search')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer', is_staff=True,
+                                            is_superuser=True)
+        cls.kitten = Post.objects.create(
+            text='Котёнок <b>спит</b> на подоконнике', author=cls.user)
+        cls.kittens = Post.objects.create(
+            text='Котята, котята и ещё раз котята', author=cls.user)
+        cls.dog = Post.objects.create(text='Собака лает', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        results = SearchResults(query)
+        return [post.pk for post in results[0:10]], results.count()
+
+    def test_ranked_prefix_search(self):
+        """Поиск без учёта регистра и по началу слова, частые выше."""
+        self.assertEqual(
+            self.found('КОТЯТ'), ([self.kittens.pk], 1))
+        self.assertEqual(
+            self.found('кот'), ([self.kittens.pk, self.kitten.pk], 2))
+        self.assertEqual(self.found('соб лает'), ([self.dog.pk], 1))
+        self.assertEqual(self.found(''), ([], 0))
+
+    def test_query_operators_are_words(self):
+        """Операторы FTS5 из ввода не ломают запрос."""
+        self.assertEqual(match_query('a OR "b" -c*'), '"a" "or" "b" "c"')
+        self.assertEqual(self.found('"собака" OR NEAR(')[1], 0)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке, удалении и bulk_create."""
+        Post.objects.filter(pk=self.dog.pk).update(text='Кошка мурлычет')
+        self.assertEqual(self.found('собака')[1], 0)
+        self.assertEqual(self.found('кошка')[0], [self.dog.pk])
+        Post.objects.filter(pk=self.dog.pk).delete()
+        self.assertEqual(self.found('кошка')[1], 0)
+        Post.objects.bulk_create([Post(text='Попугай', author=self.user)])
+        self.assertEqual(self.found('попугай')[1], 1)
+
+    def test_search_page(self):
+        """Страница поиска выделяет совпадения и экранирует текст."""
+        response = self.client.get(SEARCH_URL, {'q': 'спит'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<mark>спит</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        response = self.client.get(SEARCH_URL)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search(self):
+        """Поиск в админке идёт по тому же индексу."""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котята'})
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.kittens.pk])
@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+
+from posts.tests.base import FeedPagesTestCase
+from yatube.settings import NUMBER_POST
+
+
+class PostQueries:
+    """Считает запросы к таблице постов."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if 'posts_post' in sql:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+@override_settings(STREAMING_PAGES=True)
+class StreamingPagesTest(FeedPagesTestCase):
+    def test_same_html(self):
+        """Поток собирается в ту же страницу, что и render()."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                with override_settings(STREAMING_PAGES=False):
+                    expected = self.client.get(url).content
+                cache.clear()
+                response = self.client.get(url)
+                self.assertTrue(response.streaming)
+                self.assertEqual(
+                    b''.join(response.streaming_content), expected)
+
+    def test_head_before_queries(self):
+        """<head> и шапка уходят до запросов ленты, карточки — после."""
+        response = Client().get(self.urls[0])
+        chunks = iter(response.streaming_content)
+        counter = PostQueries()
+        with connection.execute_wrapper(counter):
+            head = next(chunks).decode()
+            self.assertEqual(counter.count, 0)
+            rest = b''.join(chunks).decode()
+        self.assertIn('</header>', head)
+        self.assertNotIn('<article', head)
+        self.assertEqual(rest.count('<article'), NUMBER_POST)
+        self.assertGreater(counter.count, 0)
+
+    def test_streamed_page_cached(self):
+        """Дошедший до конца поток сохраняется в кэш страниц."""
+        content = b''.join(self.client.get(self.urls[0]).streaming_content)
+        counter = PostQueries()
+        with connection.execute_wrapper(counter):
+            response = self.client.get(self.urls[0])
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, content)
+        self.assertEqual(counter.count, 0)
@@ -0,0 +1,192 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.images import release
+from posts.models import Post, User
+from posts.tests.base import run_now
+from posts.thumbnails import (
+    MODERN_FORMATS, SHAPES, WIDTHS, attach_pictures, backend, generate,
+    schedule, variants)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой', author=cls.user, image=uploaded())
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.pk])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюр нет, страницы показывают заглушку."""
+        for url in (reverse('posts:index'), self.POST_DETAIL_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'bg-light')
+                self.assertNotContains(response, '<img class="card-img')
+
+    def test_generate(self):
+        """generate готовит варианты для всех мест и обновляет страницы."""
+        self.client.get(reverse('posts:index'))
+        generate(self.post.pk)
+        for shape in SHAPES:
+            with self.subTest(shape=shape):
+                picture = backend.ready(self.post.image, shape)
+                self.assertTrue(picture.src.endswith('.gif'))
+                self.assertEqual(len(picture.sources), len(MODERN_FORMATS))
+        for url in (reverse('posts:index'), self.POST_DETAIL_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '<picture>')
+                self.assertContains(response, 'srcset=')
+
+    def test_variants(self):
+        """Ширины не больше исходной, исходный формат идёт последним."""
+        found = list(variants('card', 1000))
+        self.assertEqual(
+            [(format_, width) for format_, width, _, _ in found],
+            [(format_, width) for format_ in (*MODERN_FORMATS, None)
+             for width in (480, 960)])
+        self.assertEqual(found[-1][2], '960x339')
+        small = {width for _, width, _, _ in variants('full', 10)}
+        self.assertEqual(small, {WIDTHS[0]})
+
+    def test_eager_cards(self):
+        """Картинки первых карточек грузятся сразу, остальных — лениво."""
+        for i in range(2):
+            Post.objects.create(
+                text=f'Ещё пост {i}', author=self.user, image=uploaded())
+        for post in Post.objects.all():
+            generate(post.pk)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="eager"', count=2)
+        self.assertContains(response, 'loading="lazy"', count=1)
+
+    def test_fragment_cards_lazy(self):
+        """В подгружаемых при прокрутке карточках все картинки ленивые."""
+        generate(self.post.pk)
+        response = self.client.get(
+            reverse('posts:index'), {'fragment': 'cards'})
+        self.assertNotContains(response, 'loading="eager"')
+        self.assertContains(response, 'loading="lazy"', count=1)
+
+    def test_page_lookup(self):
+        """Картинки страницы ищутся одним запросом, а потом из кэша."""
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=self.user, image=uploaded())
+            generate(post.pk)
+        posts = list(Post.objects.exclude(pk=self.post.pk))
+        cache.clear()
+        with self.assertNumQueries(1):
+            attach_pictures(posts, 'card')
+        with self.assertNumQueries(0):
+            attach_pictures(posts, 'card')
+        self.assertTrue(all(post.picture for post in posts))
+
+    def test_views_schedule(self):
+        """Создание поста и смена картинки ставят миниатюры в очередь."""
+        with mock.patch('posts.views.schedule') as schedule:
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'image': uploaded('new.gif')})
+            self.client.post(
+                reverse('posts:post_edit', args=[self.post.pk]),
+                {'text': 'Только текст'})
+            self.client.post(
+                reverse('posts:post_edit', args=[self.post.pk]),
+                {'text': 'Новая картинка', 'image': uploaded('edit.gif')})
+        self.assertEqual(schedule.call_count, 2)
+        created = Post.objects.get(text='Новый пост')
+        self.assertEqual(created.image.name, self.post.image.name)
+
+    def test_schedule_without_pool(self):
+        """Без потоков миниатюры готовятся сразу после коммита."""
+        with override_settings(THUMBNAIL_WORKERS=0), \
+                mock.patch('django.db.transaction.on_commit', run_now), \
+                mock.patch('posts.thumbnails.executor') as executor:
+            schedule(self.post)
+        executor.assert_not_called()
+        self.assertIsNotNone(backend.ready(self.post.image, 'card'))
+
+    def test_shared_image(self):
+        """Одинаковые картинки делят файл и миниатюры до последнего поста."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 2), 'blue').save(buffer, 'PNG')
+        with mock.patch('django.db.transaction.on_commit', run_now):
+            posts = [
+                Post.objects.create(
+                    text=f'Копия {i}', author=self.user,
+                    image=SimpleUploadedFile(
+                        f'copy{i}.png', buffer.getvalue()))
+                for i in range(2)
+            ]
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        generate(posts[0].pk)
+        picture = backend.ready(posts[1].image, 'card')
+        self.assertIsNotNone(picture)
+        thumbnail = picture.src[len(settings.MEDIA_URL):]
+        storage = posts[0].image.storage
+        with mock.patch('django.db.transaction.on_commit', run_now):
+            posts[0].delete()
+            self.assertTrue(storage.exists(name))
+            self.assertTrue(storage.exists(thumbnail))
+            posts[1].delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(thumbnail))
+
+    def test_upload_during_release(self):
+        """Файл не удаляется, пока пост с той же картинкой не закоммичен."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 2), 'green').save(buffer, 'PNG')
+        with mock.patch('django.db.transaction.on_commit', run_now):
+            post = Post.objects.create(
+                text='Старый', author=self.user,
+                image=SimpleUploadedFile('old.png', buffer.getvalue()))
+        storage = post.image.storage
+        name = post.image.name
+        # Параллельная загрузка того же содержимого, пост ещё не в базе.
+        self.assertEqual(
+            storage.save('posts/new.png', io.BytesIO(buffer.getvalue())),
+            name)
+        with mock.patch('django.db.transaction.on_commit', run_now):
+            post.delete()
+        self.assertTrue(storage.exists(name))
+        storage.settle(name)
+        release(name)
+        self.assertFalse(storage.exists(name))
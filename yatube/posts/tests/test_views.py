@@ -1,12 +1,16 @@
 from http import HTTPStatus
+from unittest import mock
 
 from django import forms
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
 
-from posts.models import Post, Group, User, Follow
-from yatube.settings import NUMBER_POST
+from posts import feed
+from posts.models import Post, Group, User, Follow, FeedEntry, Comment
+from posts.tests.base import run_now
+from posts.utils import count_key
+from yatube.settings import NUMBER_COMMENTS, NUMBER_POST
 # Тесты не проходят если из django.conf брать
 
 TEXT_TEST = {"SLUG": "SlugTest-1",
@@ -56,6 +60,7 @@ class TaskPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -143,13 +148,29 @@ class TaskPagesTests(TestCase):
             group=self.group
         )
         response_1 = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.get(pk=post.id).delete()
+        Post.objects.filter(pk=post.id).update(text='Изменён без сигналов')
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
-        cache.clear()
+        Post.objects.get(pk=post.id).delete()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_1.content, response_3.content)
 
+    def test_cache_scopes(self):
+        """Пост сбрасывает кэш index, своей группы и профиля автора."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        before = [self.guest_client.get(url).content for url in urls]
+        Post.objects.create(
+            author=self.user, text='Новый пост в кэше', group=self.group)
+        for url, content in zip(urls, before):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotEqual(response.content, content)
+                self.assertContains(response, 'Новый пост в кэше')
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -162,10 +183,12 @@ class PaginatorViewsTest(TestCase):
             title='Тестовая группа',
             slug='group_test'
         )
+        cls.GROUP_URL = reverse('posts:group_list', args=[cls.group.slug])
         cache.clear()
 
     def setUp(self):
         """Создаем клиента и 15 постов."""
+        cache.clear()
         self.client = Client()
         posts = [Post(text=f'test_text_{i}',
                       author=self.author,
@@ -174,6 +197,71 @@ class PaginatorViewsTest(TestCase):
         self.posts = Post.objects.bulk_create(posts)
         self.second_page = Post.objects.count() % NUMBER_POST
 
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        first = self.client.get(INDEX_URL).context['page_obj']
+        self.assertEqual(len(first), NUMBER_POST)
+        self.assertIsNone(first.previous_cursor)
+        second = self.client.get(
+            INDEX_URL, {'after': first.next_cursor}).context['page_obj']
+        self.assertEqual(len(second), self.second_page)
+        self.assertEqual(second.number, 2)
+        self.assertIsNone(second.next_cursor)
+        self.assertFalse(set(first) & set(second))
+        back = self.client.get(
+            INDEX_URL, {'before': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertIsNone(back.previous_cursor)
+
+    def test_old_page_links(self):
+        """Ссылки вида ?page=N продолжают работать."""
+        urls = (
+            INDEX_URL,
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                page = self.client.get(url, {'page': 2}).context['page_obj']
+                self.assertEqual(len(page), self.second_page)
+                self.assertIsNotNone(page.previous_cursor)
+
+    def test_last_page(self):
+        """Пустой before открывает последнюю страницу без OFFSET."""
+        page = self.client.get(INDEX_URL, {'before': ''}).context['page_obj']
+        self.assertEqual(page.number, 2)
+        self.assertIsNone(page.next_cursor)
+        self.assertEqual(list(page), list(Post.objects.order_by(
+            '-pub_date', '-pk')[self.NUMBER_CREATE_POSTS - NUMBER_POST:]))
+
+    def test_page_window(self):
+        """Окно номеров страниц ограничено PAGE_WINDOW с каждой стороны."""
+        Post.objects.bulk_create(
+            Post(text='ещё пост', author=self.author) for _ in range(100))
+        response = self.client.get(INDEX_URL, {'page': 5})
+        page = response.context['page_obj']
+        self.assertEqual(list(page.page_window), [3, 4, 5, 6, 7])
+        # Соседние номера ведут по курсорам, дальние — без ссылок.
+        html = response.content.decode()
+        self.assertNotIn('?page=', html)
+        self.assertIn(f'?after={page.next_cursor}">6<', html)
+        self.assertIn(f'?before={page.previous_cursor}">4<', html)
+
+    def test_count_cache(self):
+        """Число постов кэшируется и сбрасывается при создании поста."""
+        key = count_key('group', self.group.pk)
+        self.client.get(self.GROUP_URL)
+        self.assertEqual(cache.get(key).value, self.NUMBER_CREATE_POSTS)
+        Post.objects.create(text='новый', author=self.author, group=self.group)
+        self.assertIsNone(cache.get(key))
+
+    def test_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        page = self.client.get(
+            INDEX_URL, {'after': 'broken'}).context['page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), NUMBER_POST)
+
 
 class FollowViewsTest(TestCase):
     def setUp(self):
@@ -225,3 +313,168 @@ class FollowViewsTest(TestCase):
         response = self.authorized_client.get(
             reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_feed_fan_out(self):
+        """Новый пост попадает в ленту подписчика, отписка её чистит."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='свежий пост', author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=post).exists())
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args={self.author}))
+        self.assertFalse(FeedEntry.objects.filter(user=self.follower).exists())
+
+    def test_feed_backfill_all_posts(self):
+        """Подписка и пересборка кладут в ленту все посты автора."""
+        for number in range(5):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        Follow.objects.create(user=self.follower, author=self.author)
+        other = User.objects.create_user(username='other_follower')
+        Follow.objects.create(user=other, author=self.author)
+        FeedEntry.objects.all().delete()
+        feed.rebuild([self.author.pk], batch_size=3)
+        posts = Post.objects.filter(author=self.author).count()
+        for user in (self.follower, other):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    FeedEntry.objects.filter(user=user).count(), posts)
+
+    def test_feed_count_on_delete(self):
+        """Удаление поста сбрасывает число постов в лентах подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        key = count_key('feed', self.follower.pk)
+        self.authorized_client.get(FOLLOW_INDEX)
+        self.assertIsNotNone(cache.get(key))
+        self.post_author.delete()
+        self.assertIsNone(cache.get(key))
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_feed_pull_author(self):
+        """Посты популярного автора читаются напрямую, без рассылки."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='пост для всех', author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        response = self.authorized_client.get(FOLLOW_INDEX)
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.post_author])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_feed_back_to_fan_out(self):
+        """Когда подписчиков снова мало, в ленты приходят пропущенные посты."""
+        other = User.objects.create_user(username='other_follower')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='без рассылки', author=self.author)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        with mock.patch('django.db.transaction.on_commit', run_now):
+            Follow.objects.filter(user=other).delete()
+        response = self.authorized_client.get(FOLLOW_INDEX)
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.post_author])
+
+
+class CommentViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.NUMBER_CREATE_COMMENTS = NUMBER_COMMENTS + 5
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.user)
+        for i in range(cls.NUMBER_CREATE_COMMENTS):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'comment_{i}')
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+        cls.COMMENTS_URL = reverse('posts:post_comments', args=[cls.post.id])
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_post_detail_shows_latest_comments(self):
+        """На странице поста только последние комментарии."""
+        comments = self.authorized_client.get(
+            self.POST_DETAIL_URL).context['comments']
+        self.assertEqual(len(comments), NUMBER_COMMENTS)
+        self.assertEqual(
+            comments[0].text, f'comment_{self.NUMBER_CREATE_COMMENTS - 1}')
+        self.assertIsNotNone(comments.next_cursor)
+
+    def test_older_comments_fragment(self):
+        """Ранние комментарии отдаются фрагментом по курсору."""
+        comments = self.authorized_client.get(
+            self.POST_DETAIL_URL).context['comments']
+        response = self.authorized_client.get(
+            self.COMMENTS_URL, {'after': comments.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        older = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in older],
+            [f'comment_{i}' for i in range(4, -1, -1)])
+        self.assertIsNone(older.next_cursor)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост с ETag', author=cls.user)
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def revalidate(self, client, url):
+        response = client.get(url)
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304."""
+        for url in (INDEX_URL, self.POST_DETAIL_URL, FOLLOW_INDEX):
+            with self.subTest(url=url):
+                response = self.revalidate(self.authorized_client, url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_modified_by_comment(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        response = self.authorized_client.get(self.POST_DETAIL_URL)
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        response = self.authorized_client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Да')
+
+    def test_etag_per_viewer(self):
+        """ETag одного пользователя не подходит другому."""
+        etag = self.authorized_client.get(INDEX_URL)['ETag']
+        response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_per_session(self):
+        """После нового входа страница с формой отдаётся заново."""
+        etag = self.authorized_client.get(self.POST_DETAIL_URL)['ETag']
+        self.authorized_client.logout()
+        self.authorized_client.force_login(self.user)
+        response = self.authorized_client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_no_last_modified(self):
+        """Страница сверяется только по ETag, а не по If-Modified-Since."""
+        response = self.client.get(INDEX_URL)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(
+            INDEX_URL, HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2099 00:00:00 GMT')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_missing_post(self):
+        """Для несуществующего поста условный запрос не мешает 404."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id + 100]),
+            HTTP_IF_NONE_MATCH='"any"')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
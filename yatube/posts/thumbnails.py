@@ -0,0 +1,245 @@
+"""Миниатюры постов готовятся в фоне сразу после загрузки картинки.
+
+Для каждой картинки создаётся набор ширин WIDTHS в современных форматах,
+которые умеет Pillow, и в исходном формате как запасной вариант. Шаблоны
+только ищут готовые миниатюры (тег ready_picture) и, пока их нет,
+показывают заглушку, так что первый читатель не ждёт ресайза.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .cache import bump_card, bump_pages, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Места, где выводятся картинки: имя -> (ширина, высота, sizes).
+SHAPES = {
+    'card': (960, 339, '(min-width: 1200px) 1110px, 100vw'),
+    'full': (1920, 1080, '(min-width: 1200px) 1110px, 100vw'),
+}
+WIDTHS = (480, 960, 1440, 1920)
+
+Image.init()
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+# Современные форматы, которые может записать установленный Pillow.
+MODERN_FORMATS = tuple(
+    format_ for format_ in MIME_TYPES if format_ in Image.SAVE)
+
+_executor = None
+
+
+def variants(shape, source_width=None):
+    """Пары (формат, ширина, геометрия, опции sorl) для места shape.
+
+    Формат None — исходный формат картинки. Ширины больше исходной
+    не создаются: миниатюры не растягиваются.
+    """
+    width, height, _ = SHAPES[shape]
+    widths = [w for w in WIDTHS if source_width is None or w <= source_width]
+    for format_ in (*MODERN_FORMATS, None):
+        for w in widths or WIDTHS[:1]:
+            options = {'crop': 'center', 'upscale': False}
+            if format_ is not None:
+                options['format'] = format_
+            yield format_, w, f'{w}x{round(w * height / width)}', options
+
+
+class Picture:
+    """Готовые варианты картинки для <picture> с srcset."""
+
+    def __init__(self, shape, ready, sizes=None):
+        self.width, self.height, self.sizes = SHAPES[shape]
+        self.sizes = sizes or self.sizes
+        self.sources = [
+            {'type': MIME_TYPES[format_], 'srcset': self.srcset_of(found)}
+            for format_, found in ready.items()
+            if format_ is not None and found
+        ]
+        fallback = ready.get(None) or []
+        self.srcset = self.srcset_of(fallback)
+        self.src = fallback[-1][1].url if fallback else None
+        for width, thumbnail in fallback:
+            if width >= self.width:
+                self.src = thumbnail.url
+                break
+
+    @staticmethod
+    def srcset_of(found):
+        return ', '.join(f'{thumbnail.url} {width}w'
+                         for width, thumbnail in found)
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl: понимает AVIF и умеет искать готовые миниатюры."""
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        extension = EXTENSIONS.get(
+            options['format'], options['format'].lower())
+        return (f'{thumbnail_settings.THUMBNAIL_PREFIX}'
+                f'{key[:2]}/{key[2:4]}/{key}.{extension}')
+
+    def thumbnail(self, source, geometry, options):
+        """Миниатюра с тем же именем, что создал бы get_thumbnail."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry, options)
+        return ImageFile(name, default.storage)
+
+    def pictures(self, files, shape, sizes=None):
+        """Picture места shape для каждого файла, None — если не готова.
+
+        Все варианты всех файлов ищутся одним обращением к KVStore.
+        """
+        wanted = []
+        for file_ in files:
+            source = ImageFile(file_) if file_ else None
+            wanted.append([
+                (format_, width,
+                 self.thumbnail(source, geometry, options).key)
+                for format_, width, geometry, options in variants(shape)
+            ] if source else [])
+        found = lookup(key for items in wanted for _, _, key in items)
+        result = []
+        for items in wanted:
+            ready = {}
+            for format_, width, key in items:
+                if key in found:
+                    ready.setdefault(format_, []).append((width, found[key]))
+            result.append(
+                Picture(shape, ready, sizes) if ready.get(None) else None)
+        return result
+
+    def ready(self, file_, shape, sizes=None):
+        """Picture из готовых миниатюр места shape или None."""
+        return self.pictures([file_], shape, sizes)[0]
+
+
+def lookup(keys):
+    """Готовые миниатюры по ключам ImageFile.key.
+
+    Для KVStore в кэше и базе всё читается одним get_many, а промахи —
+    одним запросом к базе, как это сделал бы KVStore по одному ключу.
+    """
+    keys = {add_prefix(key): key for key in keys}
+    if not isinstance(default.kvstore, CachedDBStore):
+        return {
+            key: thumbnail for key, thumbnail in (
+                (key, default.kvstore._get(key)) for key in keys.values())
+            if thumbnail is not None
+        }
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = keys.keys() - values.keys()
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        keys[raw]: deserialize_image_file(value)
+        for raw, value in values.items()
+        if value and value is not EMPTY_VALUE
+    }
+
+
+def attach_pictures(posts, shape, sizes=None):
+    """Кладёт в post.picture готовые варианты картинки каждого поста."""
+    posts = list(posts)
+    found = backend.pictures([post.image for post in posts], shape, sizes)
+    for post, picture in zip(posts, found):
+        post.picture = picture
+
+
+backend = PostThumbnailBackend()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def source_width(image):
+    width = getattr(image, 'width', None)
+    if width is None:
+        with default.storage.open(str(image)) as file_:
+            width = Image.open(file_).size[0]
+    return width
+
+
+def render(image):
+    """Создаёт все варианты картинки для всех мест из SHAPES."""
+    width = source_width(image)
+    for shape in SHAPES:
+        for _, _, geometry, options in variants(shape, width):
+            get_thumbnail(image, geometry, **options)
+
+
+def generate(post_id):
+    """Готовит миниатюры поста и сбрасывает кэш его карточек и страниц."""
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    render(post.image)
+    bump_card('post', post.pk)
+    bump_pages(*post_scopes(post))
+
+
+def build(post_id):
+    """generate, ошибки которого пишутся в лог, а не теряются во Future."""
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры поста %s', post_id)
+
+
+def work(post_id):
+    """Задача пула."""
+    try:
+        build(post_id)
+    finally:
+        # Соединение с базой открыто в потоке пула, закрываем его сами.
+        connections.close_all()
+
+
+def schedule(post):
+    """Готовит миниатюры поста после коммита транзакции.
+
+    При THUMBNAIL_WORKERS = 0 (и в тестах) — сразу, в том же потоке:
+    пул пережил бы временный MEDIA_ROOT теста и писал бы в настоящий.
+    """
+    if not post.image:
+        return
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: executor().submit(work, post.pk))
+    else:
+        transaction.on_commit(lambda: build(post.pk))
@@ -1,9 +1,175 @@
+from functools import partial
 
-from yatube.settings import NUMBER_POST
+from yatube.settings import NUMBER_COMMENTS
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+from core.cache import fetch
 
-def page_paginator(request, posts):
-    paginator = Paginator(posts, NUMBER_POST)
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (pub_date, id).
+
+    Соседняя страница выбирается условием по ключу крайнего объекта
+    текущей страницы, а не через OFFSET, поэтому глубокие страницы
+    открываются так же быстро, как первая. Число страниц для окна
+    номеров берётся из кэша по count_key, а не через COUNT(*).
+    """
+    date_field = 'pub_date'
+    pk_field = 'pk'
+
+    def __init__(self, object_list, per_page, date_field=None,
+                 count_key=None, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if date_field is not None:
+            self.date_field = date_field
+        self.count_key = count_key
+        if count is not None:
+            # Заранее известное число, например денормализованный счётчик.
+            self.__dict__['count'] = count
+
+    @cached_property
+    def count(self):
+        """Число объектов; при заданном count_key берётся из кэша."""
+        if self.count_key is None:
+            return Paginator.count.func(self)
+        return fetch(
+            self.count_key,
+            partial(Paginator.count.func, self),
+            settings.PAGINATOR_COUNT_CACHE_TIME,
+        )
+
+    def page_window(self, number):
+        """Номера страниц вокруг текущей, не больше 2 * PAGE_WINDOW + 1."""
+        first = max(number - settings.PAGE_WINDOW, 1)
+        last = min(number + settings.PAGE_WINDOW, self.num_pages)
+        return range(first, last + 1)
+
+    def cursor_key(self, obj):
+        """(дата, id) объекта страницы, из которых строится курсор."""
+        return getattr(obj, self.date_field), obj.pk
+
+    def encode_cursor(self, obj, number):
+        date, pk = self.cursor_key(obj)
+        value = '|'.join((str(number), date.isoformat(), str(pk)))
+        return urlsafe_base64_encode(force_bytes(value))
+
+    def decode_cursor(self, token):
+        """(номер страницы, дата, id) или None для плохого токена."""
+        try:
+            number, date, pk = urlsafe_base64_decode(token).decode().split('|')
+            number, date, pk = int(number), parse_datetime(date), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if date is None:
+            return None
+        return number, date, pk
+
+    def keyset(self, queryset, cursor=None, newer=False, pk_field=None):
+        """Объекты старше курсора в порядке ленты, или новее, если newer."""
+        date_field = self.date_field
+        pk_field = pk_field or self.pk_field
+        if cursor is not None:
+            _, date, pk = cursor
+            lookup = 'gt' if newer else 'lt'
+            # Нестрогое условие по дате задаёт границу диапазона индекса,
+            # иначе SQLite читает индекс с самого начала.
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__{lookup}e': date}),
+                Q(**{f'{date_field}__{lookup}': date})
+                | Q(**{f'{pk_field}__{lookup}': pk}),
+            )
+        direction = '' if newer else '-'
+        return queryset.order_by(direction + date_field, direction + pk_field)
+
+    def fetch(self, cursor, newer, limit):
+        return list(self.keyset(self.object_list, cursor, newer)[:limit])
+
+    def cursor_page(self, after=None, before=None):
+        """Страница, следующая за курсором after или предшествующая before.
+
+        Пустой before открывает последнюю страницу ленты.
+        """
+        newer = before is not None
+        token = before if newer else after
+        cursor = self.decode_cursor(token) if token else None
+        if token and cursor is None:
+            newer = False
+        rows = self.fetch(cursor, newer, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if newer:
+            if not rows:
+                return self.cursor_page()
+            rows.reverse()
+            if cursor is None:
+                number = self.num_pages if has_more else 1
+            else:
+                number = max(cursor[0] - 1, 2) if has_more else 1
+            has_previous, has_next = has_more, cursor is not None
+        else:
+            number = cursor[0] + 1 if cursor else 1
+            has_previous, has_next = cursor is not None, has_more
+        page = self._get_page(rows, number, self)
+        page.previous_cursor = page.next_cursor = None
+        if rows and has_previous:
+            page.previous_cursor = self.encode_cursor(rows[0], number)
+        elif has_previous:
+            page.previous_cursor = token
+        if rows and has_next:
+            page.next_cursor = self.encode_cursor(rows[-1], number)
+        page.page_window = self.page_window(number)
+        return page
+
+    def numbered_page(self, number):
+        """Страница по старой ссылке ?page=N, дальше навигация по курсорам."""
+        page = self.get_page(number)
+        page.object_list = list(page.object_list)
+        page.previous_cursor = page.next_cursor = None
+        if page.has_previous():
+            page.previous_cursor = self.encode_cursor(page[0], page.number)
+        if page.has_next():
+            page.next_cursor = self.encode_cursor(page[-1], page.number)
+        page.page_window = self.page_window(page.number)
+        return page
+
+
+def count_key(scope, pk=''):
+    return f'posts_count:{scope}:{pk}'
+
+
+def forget_counts(post, *group_ids):
+    """Сбрасывает кэшированные счётчики лент, в которые входит пост."""
+    keys = [count_key('index'), count_key('author', post.author_id)]
+    keys += [
+        count_key('group', pk) for pk in {post.group_id, *group_ids} if pk
+    ]
+    cache.delete_many(keys)
+
+
+def page_paginator(request, posts, paginator_class=CursorPaginator, **kwargs):
+    paginator = paginator_class(posts, settings.NUMBER_POST, **kwargs)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        return paginator.numbered_page(page_number)
+    return paginator.cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def comment_paginator(request, post):
+    """Страница комментариев поста, от новых к старым."""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        NUMBER_COMMENTS,
+        date_field='created',
+        count=post.comments_count,
+    )
+    return paginator.cursor_page(after=request.GET.get('after'))
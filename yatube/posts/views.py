@@ -1,77 +1,202 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.utils.functional import SimpleLazyObject
 
+from core.streaming import stream_template, unbuffered
 from .models import Group, Post, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import page_paginator
+from .cache import attach_cards, cache_generations, conditional
+from .counters import stats_for
+from .feed import FollowFeedPaginator
+from .search import SearchResults
+from .thumbnails import attach_pictures, schedule
+from .utils import comment_paginator, count_key, page_paginator
+from yatube.settings import NUMBER_POST
 
-CACHE_TIME = 20
 SELECT_LIMIT = 10
+CARD_PICTURES = partial(attach_pictures, shape='card')
+FULL_PICTURES = partial(attach_pictures, shape='full')
+
+
+def wants_cards(request):
+    """Запрошены только карточки для подгрузки при прокрутке."""
+    return request.GET.get('fragment') == 'cards'
+
+
+def eager_cards(request):
+    """Сколько первых карточек грузят картинку сразу.
+
+    Во фрагменте ни одной: он всегда ниже первого экрана.
+    """
+    return 0 if wants_cards(request) else settings.EAGER_CARDS
+
+
+def cards_fragment(request, item, page_obj):
+    """Карточки страницы без обвязки; курсор дальше — в X-Next-Cursor.
+
+    item — шаблон одной карточки ленты, тот же, что на полной странице.
+    """
+    response = render(request, 'posts/cards.html', {
+        'page_obj': page_obj, 'item': item, 'continued': True})
+    response['X-Next-Cursor'] = page_obj.next_cursor or ''
+    return response
 
 
-@cache_page(CACHE_TIME)
+def render_feed(request, template, item, page, context=None):
+    """Страница ленты или только её карточки, см. cards_fragment.
+
+    page() выбирает посты и готовит карточки. С STREAMING_PAGES страница
+    отдаётся потоком: <head> и шапка уходят сразу, page() выполняется,
+    когда шаблон дойдёт до ленты, а карточки идут по одной.
+    """
+    if wants_cards(request):
+        return cards_fragment(request, item, page())
+    context = dict(context or {})
+    if not settings.STREAMING_PAGES:
+        context['page_obj'] = page()
+        return render(request, template, context)
+    context['page_obj'] = SimpleLazyObject(page)
+    return unbuffered(stream_template(template, context, request))
+
+
+@conditional('global')
+@cache_generations('global')
 def index(request):
-    posts = Post.objects.select_related('author', 'group')
-    return render(request, 'posts/index.html', {'page_obj':
-                  page_paginator(request, posts)})
+    def page():
+        posts = Post.objects.select_related('author', 'group')
+        page_obj = page_paginator(
+            request, posts, count_key=count_key('index'))
+        attach_cards(page_obj, 'includes/card_post.html', CARD_PICTURES,
+                     eager_cards(request))
+        return page_obj
+
+    return render_feed(
+        request, 'posts/index.html', 'posts/cards/index.html', page)
 
 
+@conditional('group:{slug}')
+@cache_generations('group:{slug}')
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author', 'group')
+
+    def page():
+        posts = group.posts.select_related('author', 'group')
+        page_obj = page_paginator(
+            request, posts, count_key=count_key('group', group.pk))
+        attach_cards(page_obj, 'includes/posts_form.html', FULL_PICTURES,
+                     eager_cards(request))
+        return page_obj
+
     context = {
         'group': group,
-        'page_obj': page_paginator(request, posts),
     }
-    return render(request, template, context)
+    return render_feed(
+        request, template, 'posts/cards/group_list.html', page, context)
 
 
+@conditional('author:{username}')
+@cache_generations('author:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author', 'group')
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+
+    def page():
+        posts = author.posts.select_related('author', 'group')
+        page_obj = page_paginator(
+            request, posts, count_key=count_key('author', author.pk))
+        attach_cards(page_obj, 'includes/posts_form.html', FULL_PICTURES,
+                     eager_cards(request))
+        return page_obj
+
+    if wants_cards(request):
+        return cards_fragment(request, 'posts/cards/profile.html', page())
+    stats = stats_for(author)
     self_follow = False
     following = (
         request.user.is_authenticated
         and request.user != author
         and request.user.follower.filter(author=author).exists()
     )
-    follower_count = author.follower.count()
-    following_count = author.following.count()
     context = {
         'author': author,
-        'follower_count': follower_count,
-        'following_count': following_count,
+        'follower_count': stats.follower_count,
+        'following_count': stats.following_count,
         'following': following,
         'self_follow': self_follow,
-        'page_obj': page_paginator(request, posts)
     }
-    return render(request, 'posts/profile.html', context)
+    return render_feed(
+        request, 'posts/profile.html', 'posts/cards/profile.html', page,
+        context)
+
+
+def post_page_scopes(request, post_id):
+    """Области страницы поста: сам пост, его автор и группа."""
+    found = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if found is None:
+        return None
+    username, slug = found
+    scopes = [f'post:{post_id}', f'author:{username}']
+    if slug:
+        scopes.append(f'group:{slug}')
+    return scopes
+
 
+def follow_scopes(request):
+    """Лента подписок меняется с любым постом и с подписками читателя."""
+    return ['global', f'author:{request.user.username}']
 
+
+@conditional(post_page_scopes)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    stats_for(post.author)
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': comment_paginator(request, post),
     }
     return render(request, template, context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), NUMBER_POST)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(
+        Post.objects.only('pk', 'comments_count'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comment_paginator(request, post),
+    }
+    return render(request, 'includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     template = "posts/create_post.html"
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
         return render(request, template, {"form": form})
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    schedule(post)
     return redirect("posts:profile", username=post.author)
 
 
@@ -85,6 +210,8 @@ def post_edit(request, post_id):
                     instance=post)
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            schedule(post)
         return redirect('posts:post_detail', post.pk,)
     is_edit = True
     context = {'form': form, 'is_edit': is_edit}
@@ -104,11 +231,21 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional(follow_scopes)
 def follow_index(request):
-    posts_list = Post.objects.filter(
-        author__following__user=request.user)
-    context = {'page_obj': page_paginator(request, posts_list), }
-    return render(request, 'posts/follow.html', context)
+    def page():
+        posts_list = Post.objects.filter(
+            author__following__user=request.user).select_related(
+            'author', 'group')
+        page_obj = page_paginator(
+            request, posts_list, FollowFeedPaginator, user=request.user,
+            count_key=count_key('feed', request.user.pk))
+        attach_cards(page_obj, 'includes/card_post.html', CARD_PICTURES,
+                     eager_cards(request))
+        return page_obj
+
+    return render_feed(
+        request, 'posts/follow.html', 'posts/cards/follow.html', page)
 
 
 @login_required
@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,10 +26,32 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# manage.py test или pytest.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+# Процессы держат небольшой LRU перед общим хранилищем в SQLite и
+# сбрасывают его по сообщениям об инвалидации из того же файла.
+# Файл не кладётся в общий /tmp: значения в нём читаются через pickle.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 30,
+            'POLL_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_PATH',
+            os.path.join(BASE_DIR, 'cache.sqlite3'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
 
 INSTALLED_APPS = [
@@ -39,6 +65,7 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
@@ -70,6 +97,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.events.events',
             ],
         },
     },
@@ -121,5 +149,54 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 NUMBER_POST = 10
+NUMBER_COMMENTS = 20
+PAGE_WINDOW = 2
+PAGINATOR_COUNT_CACHE_TIME = 60 * 60
+CARD_CACHE_TIME = 60 * 60 * 24
+PAGE_CACHE_TIME = 60 * 60 * 6
+# Потоки, которые готовят миниатюры после загрузки картинки;
+# 0 — готовить в самом запросе.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_BACKEND = 'posts.thumbnails.PostThumbnailBackend'
+THUMBNAIL_PRESERVE_FORMAT = True
+# Загруженные картинки уменьшаются до IMAGE_MAX_SIZE по длинной стороне,
+# картинки больше IMAGE_MAX_PIXELS отклоняются до декодирования.
+IMAGE_MAX_SIZE = 2560
+IMAGE_MAX_PIXELS = 64 * 1000 * 1000
+# Сколько первых карточек страницы грузят картинку без loading="lazy".
+EAGER_CARDS = 2
+# Авторы с большим числом подписчиков не рассылают посты по лентам,
+# их посты подмешиваются в ленту подписок при чтении.
+FEED_FANOUT_LIMIT = 1000
+# Наибольший ?limit= в JSON API.
+API_MAX_LIMIT = 100
+# Потоки SSE о новых постах и комментариях. Каждый поток занимает поток
+# сервера до EVENTS_STREAM_TIME, и браузер сразу переподключается: пул
+# обычного синхронного gunicorn или uWSGI кончится от нескольких вкладок.
+# Включайте только с асинхронными или многопоточными воркерами
+# (gunicorn -k gevent, --threads с запасом).
+EVENTS_ENABLED = os.environ.get('YATUBE_EVENTS') == '1'
+# Журнал событий SSE, общий для процессов на машине, как кэш.
+EVENTS_PATH = os.environ.get(
+    'YATUBE_EVENTS_PATH', os.path.join(BASE_DIR, 'events.sqlite3'))
+EVENTS_POLL_INTERVAL = 0.5
+EVENTS_HEARTBEAT = 15
+# Через сколько секунд поток закрывается и браузер переподключается.
+EVENTS_STREAM_TIME = 60 * 5
+# Пауза перед переподключением браузера, мс.
+EVENTS_RETRY = 3000
+EVENTS_QUEUE_LIMIT = 100
+# Ленты отдаются потоком: <head> и шапка уходят до запросов к базе.
+# Включайте там, где сервер и прокси не копят ответ целиком.
+STREAMING_PAGES = os.environ.get('YATUBE_STREAMING_PAGES') == '1'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+if TESTING:
+    # Свой каталог на каждый запуск: cache.clear() в тестах не трогает
+    # кэш сервера, а параллельные запуски не мешают друг другу.
+    TEST_DIR = tempfile.mkdtemp(prefix='yatube-tests-')
+    atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+    CACHES['shared']['LOCATION'] = os.path.join(TEST_DIR, 'cache.sqlite3')
+    EVENTS_PATH = os.path.join(TEST_DIR, 'events.sqlite3')
+    THUMBNAIL_WORKERS = 0